@@ -11,6 +11,10 @@ npm install
 echo "Building frontend..."
 npm run build
 
+# Precompress build assets so the server does not have to on startup
+echo "Precompressing build assets..."
+python src/backend/static_assets.py dist
+
 # Check if build was successful
 if [ -f "dist/index.html" ]; then
     echo "✅ Frontend build successful!"
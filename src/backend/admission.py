@@ -0,0 +1,101 @@
+"""
+Admission control for calls to rate-limited upstreams.
+Caps concurrent calls and holds excess callers in a bounded queue with a
+per-request deadline; anything beyond that is rejected immediately so the
+requests we do accept keep predictable latency.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+class OverloadedError(Exception):
+    """Raised when a call cannot be admitted; retry_after is in seconds"""
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Upstream overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = 10, max_queue: int = 50, queue_timeout: float = 5):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout  # seconds a caller may wait for a slot
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting_seen = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_times: Deque[float] = deque(maxlen=500)
+        # Created on first use inside the running loop; controllers are built
+        # at import time and Python 3.9 binds the semaphore to a loop on creation
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    def _abandon(self, acquire: asyncio.Future) -> None:
+        """Stop waiting on an acquire, handing back the permit if it was granted anyway"""
+        if not acquire.done():
+            acquire.cancel()
+        elif not acquire.cancelled() and acquire.exception() is None:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Hold one upstream slot for the duration of the block"""
+        # Callers already waiting count too, even if they have not reached the semaphore yet
+        if self.in_flight + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected_queue_full += 1
+            raise OverloadedError("queue full", self._retry_after())
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        started = time.monotonic()
+        self.waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        # Before Python 3.12, wait_for can time out or be cancelled just as the
+        # acquire succeeds and drop the permit, so the acquire runs as its own
+        # task and is settled by _abandon if we give up on it
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(acquire),
+                timeout=self.queue_timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            self._abandon(acquire)
+            self.rejected_timeout += 1
+            raise OverloadedError("queue timeout", self._retry_after())
+        except BaseException:
+            self._abandon(acquire)
+            raise
+        finally:
+            self.waiting -= 1
+
+        self.wait_times.append(time.monotonic() - started)
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict:
+        waits = sorted(self.wait_times)
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "max_queue_depth_seen": self.max_waiting_seen,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_avg": sum(waits) / len(waits) if waits else None,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else None,
+        }
@@ -1,14 +1,17 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Dict
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from database import get_db_connection
+from database import get_db_connection, ADMIN_CHANGES_CHANNEL
+import database_async
+import hashlib
 import os
+import time
+from collections import OrderedDict
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; request handlers use passwords.password_pool instead
+from passwords import pwd_context
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -51,6 +54,7 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def get_admin(username: str):
+    """Synchronous admin lookup for CLI scripts; request handlers use database_async.get_admin"""
     with get_db_connection(quiet=True) as conn:
         with conn.cursor() as cur:
             cur.execute(
@@ -101,23 +105,91 @@ def create_tokens(username: str) -> dict:
         "token_type": "bearer"
     }
 
+# Verified JWT cache: sha256(token) -> claims, in LRU order. Entries are
+# only served until the token's own exp, so expiry is still enforced.
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "1024"))
+_token_cache: "OrderedDict[bytes, dict]" = OrderedDict()
+token_cache_stats = {"hits": 0, "misses": 0}
+
+def decode_token(token: str) -> dict:
+    """Verify a JWT and return its claims, reusing earlier verifications. Raises JWTError."""
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = _token_cache.get(digest)
+    if claims is not None:
+        if claims["exp"] > time.time():
+            _token_cache.move_to_end(digest)
+            token_cache_stats["hits"] += 1
+            return claims
+        del _token_cache[digest]
+
+    token_cache_stats["misses"] += 1
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if JWT_CACHE_SIZE > 0 and isinstance(claims.get("exp"), (int, float)):
+        _token_cache[digest] = claims
+        if len(_token_cache) > JWT_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return claims
+
+# Admin principal cache: username -> monotonic expiry. Only confirmed admins
+# are cached. Admins are created by create_admin.py and removed directly in
+# the database, outside the server, so the admins_notify trigger publishes
+# every change on ADMIN_CHANGES_CHANNEL and the server drops the entry as soon
+# as it hears of it. The TTL only bounds staleness while the listener is
+# disconnected; a failed lookup drops the entry at once.
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "60"))
+_admin_cache: Dict[str, float] = {}
+admin_cache_stats = {"hits": 0, "misses": 0}
+
+def cache_admin(username: str) -> None:
+    """Remember that username is a valid admin for ADMIN_CACHE_TTL seconds"""
+    if ADMIN_CACHE_TTL > 0:
+        _admin_cache[username] = time.monotonic() + ADMIN_CACHE_TTL
+
+def invalidate_admin(username: Optional[str] = None) -> None:
+    """Forget a cached admin, or every cached admin if no username is given"""
+    if username is None:
+        _admin_cache.clear()
+    else:
+        _admin_cache.pop(username, None)
+
+async def admin_exists(username: str) -> bool:
+    """Check that an admin still exists, served from the principal cache when fresh"""
+    expires_at = _admin_cache.get(username)
+    if expires_at is not None and expires_at > time.monotonic():
+        admin_cache_stats["hits"] += 1
+        return True
+
+    admin_cache_stats["misses"] += 1
+    if await database_async.get_admin(username) is None:
+        invalidate_admin(username)
+        return False
+    cache_admin(username)
+    return True
+
 async def get_current_admin(token: str = Depends(oauth2_scheme)):
+    return (await verify_admin_token(token))["sub"]
+
+async def get_current_admin_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """Like get_current_admin, but returns the token's claims, for streams that must end at its exp"""
+    return await verify_admin_token(token)
+
+async def verify_admin_token(token: str) -> dict:
+    """Return the claims of a valid admin access token, or raise 401"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        admin = get_admin(username)
-        if admin is None:
+        if not await admin_exists(username):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    return username
+    return payload
 
 # Initialize admin table
 def init_admin_table():
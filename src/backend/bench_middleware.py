@@ -0,0 +1,118 @@
+"""
+Benchmark for the request-path middleware.
+Measures requests/sec on /api/getAgentId with the previous
+BaseHTTPMiddleware rate limiter and with the pure-ASGI middleware stack,
+in-process through httpx's ASGI transport (no network), plus the cost of
+a rejected request in each. Also replays a typical admin dashboard session
+against the default limits, which must fit in the admin budget.
+
+Usage: python bench_middleware.py [--requests 5000]
+"""
+import argparse
+import asyncio
+import os
+import time
+import httpx
+from fastapi import FastAPI, HTTPException
+from starlette.middleware.base import BaseHTTPMiddleware
+from middleware import RateLimitMiddleware, TimingMiddleware, bearer_token
+from rate_limit import SlidingWindowLimiter
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """The previous middleware: BaseHTTPMiddleware raising HTTPException"""
+    def __init__(self, app, limiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request, call_next):
+        if request.url.path.startswith('/static') or request.url.path.startswith('/admin'):
+            return await call_next(request)
+        if self.limiter.hit(request.client.host):
+            raise HTTPException(status_code=429, detail="Too many requests. Please try again later.")
+        return await call_next(request)
+
+def build_app(pure_asgi: bool, limit: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/getAgentId")
+    def get_unsigned_url():
+        return {"agentId": os.getenv("AGENT_ID")}
+
+    limiter = SlidingWindowLimiter(limit, 60)
+    if pure_asgi:
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
+        app.add_middleware(TimingMiddleware)
+    else:
+        app.add_middleware(LegacyRateLimitMiddleware, limiter=limiter)
+    return app
+
+async def requests_per_second(app: FastAPI, count: int, concurrency: int = 20) -> tuple:
+    """Returns (requests/sec, status code of the last response)"""
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        statuses = []
+
+        async def worker(n: int):
+            for _ in range(n):
+                response = await client.get("/api/getAgentId")
+                statuses.append(response.status_code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(count // concurrency) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return len(statuses) / elapsed, statuses[-1]
+
+# One admin filtering and paging: the initial list, a debounced name search
+# per keystroke, Load More, a paged Refresh, event stream reconnects and an
+# export, all within one minute
+DASHBOARD_SESSION = [
+    "/api/codes",
+    *(f"/api/codes?name_prefix={'smith'[:n]}" for n in range(1, 6)),
+    *("/api/codes?name_prefix=smith&cursor=page" for _ in range(3)),
+    *("/api/codes/changes?since=1" for _ in range(3)),
+    *("/api/events" for _ in range(3)),
+    "/api/codes/export?format=csv",
+]
+
+def build_dashboard_app() -> FastAPI:
+    """An app with the server's default limits, treating the token "admin" as a valid admin"""
+    app = FastAPI()
+
+    @app.get("/api/{path:path}")
+    def api(path: str):
+        return {}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=SlidingWindowLimiter(10, 60),
+        admin_limiter=SlidingWindowLimiter(300, 60),
+        admin_key=lambda scope: "admin" if bearer_token(scope) == "admin" else None,
+    )
+    return app
+
+async def dashboard_session(token: str) -> int:
+    """Replay DASHBOARD_SESSION with a bearer token, returning how many requests got 429"""
+    transport = httpx.ASGITransport(app=build_dashboard_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Authorization": f"Bearer {token}"}
+        statuses = [(await client.get(path, headers=headers)).status_code for path in DASHBOARD_SESSION]
+    return statuses.count(429)
+
+async def main(count: int):
+    print(f"{'middleware':<20} {'accepted req/s':>15} {'rejected req/s':>15} {'rejection status':>17}")
+    for name, pure_asgi in (("BaseHTTPMiddleware", False), ("pure ASGI", True)):
+        accepted, _ = await requests_per_second(build_app(pure_asgi, limit=10 ** 9), count)
+        rejected, status_code = await requests_per_second(build_app(pure_asgi, limit=1), count)
+        print(f"{name:<20} {accepted:>15.0f} {rejected:>15.0f} {status_code:>17}")
+
+    admin_rejected = await dashboard_session("admin")
+    anonymous_rejected = await dashboard_session("invalid")
+    print(f"\nDashboard session of {len(DASHBOARD_SESSION)} requests: "
+          f"{admin_rejected} rejected as admin, {anonymous_rejected} with an invalid token")
+    if admin_rejected:
+        raise SystemExit("A normal dashboard session exceeded the admin rate limit")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    asyncio.run(main(parser.parse_args().requests))
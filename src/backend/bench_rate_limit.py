@@ -0,0 +1,78 @@
+"""
+Microbenchmark for the rate limiter.
+Compares the previous timestamp-list approach with SlidingWindowLimiter:
+per-request cost for a busy key and across many keys, and memory per
+100k tracked keys.
+
+Usage: python bench_rate_limit.py [--keys 100000]
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+from rate_limit import SlidingWindowLimiter
+
+class ListRateLimiter:
+    """The previous implementation: a list of datetimes per key, rebuilt on every hit"""
+    def __init__(self, window_size: int, max_requests: int):
+        self.window_size = window_size
+        self.max_requests = max_requests
+        self.requests = {}
+
+    def hit(self, key: str) -> bool:
+        now = datetime.utcnow()
+        if key not in self.requests:
+            self.requests[key] = []
+        self.requests[key] = [ts for ts in self.requests[key]
+                              if (now - ts).seconds < self.window_size]
+        if len(self.requests[key]) >= self.max_requests:
+            return False
+        self.requests[key].append(now)
+        return True
+
+def time_per_hit(hit, keys, rounds: int) -> float:
+    """Average nanoseconds per hit() over rounds passes of keys"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            hit(key)
+    return (time.perf_counter() - started) / (rounds * len(keys)) * 1e9
+
+def memory_for_keys(make_limiter, count: int, hits_per_key: int) -> int:
+    """Bytes allocated to track count distinct keys"""
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    limiter = make_limiter()
+    for _ in range(hits_per_key):
+        for key in keys:
+            limiter.hit(key)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=100_000, help="distinct keys for the memory test")
+    args = parser.parse_args()
+
+    # Large limits so both implementations keep accepting and doing full work
+    busy_limit = 1000
+    implementations = {
+        "timestamp list": lambda: ListRateLimiter(60, busy_limit),
+        "sliding window": lambda: SlidingWindowLimiter(busy_limit, 60, max_keys=args.keys),
+    }
+
+    print(f"{'implementation':<16} {'busy key ns/hit':>16} {'1k keys ns/hit':>15} "
+          f"{'bytes/key (1 hit)':>18} {'bytes/key (10 hits)':>20} {f'MB/{args.keys} keys':>15}")
+    for name, make_limiter in implementations.items():
+        busy = time_per_hit(make_limiter().hit, ["203.0.113.7"], 900)
+        many_keys = [f"198.51.{i >> 8}.{i & 255}" for i in range(1000)]
+        spread = time_per_hit(make_limiter().hit, many_keys, 20)
+        single = memory_for_keys(make_limiter, args.keys, 1)
+        repeated = memory_for_keys(make_limiter, args.keys, 10)
+        print(f"{name:<16} {busy:>16.0f} {spread:>15.0f} "
+              f"{single / args.keys:>18.0f} {repeated / args.keys:>20.0f} {repeated / 1e6:>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark for JSON response serialization of invitation code lists.
+Compares what FastAPI does with a response_model and its default
+JSONResponse (validate every row, jsonable_encoder, json.dumps) with the
+ORJSONResponse default response class, and with the trusted path that
+hands database rows straight to orjson.
+
+Usage: python bench_serialization.py [--rows 10000 100000]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+class InvitationCodeResponse(BaseModel):
+    """The response model /api/codes used before it returned trusted rows"""
+    code: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    created_at: datetime
+    expires_at: datetime
+    max_calls: int
+    call_count: int
+    is_valid: bool
+
+def make_rows(count: int) -> List[dict]:
+    """Rows shaped like the database returns them"""
+    now = datetime.utcnow()
+    return [
+        {
+            "code": f"CODE{i:07d}",
+            "first_name": f"First{i}",
+            "last_name": None if i % 3 else f"Last{i}",
+            "created_at": now - timedelta(minutes=i),
+            "expires_at": now + timedelta(days=30, minutes=i),
+            "max_calls": 10,
+            "call_count": i % 11,
+            "is_valid": i % 11 < 10,
+        }
+        for i in range(count)
+    ]
+
+def validated_json(rows, adapter) -> bytes:
+    """response_model=List[InvitationCodeResponse] with the standard JSONResponse"""
+    models = adapter.validate_python(rows)
+    content = jsonable_encoder(adapter.dump_python(models, mode="python"))
+    return JSONResponse(content).body
+
+def default_orjson(rows, adapter) -> bytes:
+    """No response_model, ORJSONResponse as default class: jsonable_encoder still runs"""
+    return ORJSONResponse(jsonable_encoder(rows)).body
+
+def trusted_orjson(rows, adapter) -> bytes:
+    """trusted_response(): rows go straight to orjson"""
+    return ORJSONResponse(rows).body
+
+def measure(serialize, rows, adapter, repeat: int = 3):
+    """Best wall time in milliseconds and the response size"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = serialize(rows, adapter)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="list sizes to serialize")
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[InvitationCodeResponse])
+    for count in args.rows:
+        rows = make_rows(count)
+        print(f"{count:,} rows")
+        baseline = None
+        for name, serialize in (
+            ("validated + json", validated_json),
+            ("orjson default class", default_orjson),
+            ("trusted orjson", trusted_orjson),
+        ):
+            ms, size = measure(serialize, rows, adapter)
+            baseline = baseline or ms
+            print(f"  {name:<22} {ms:9.1f} ms  {baseline / ms:5.1f}x  {size / 1024:,.0f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark for static asset delivery: bytes on the wire and an estimate of
+time-to-interactive for a student loading the home page.
+A visit fetches index.html and then the scripts and stylesheets it links,
+the way a browser does. Two setups are compared:
+
+  before  uncompressed responses, nothing reused between visits
+  after   br/gzip variants, strong ETags and immutable hashed assets
+
+Each is measured for a first visit and a repeat visit with a warm browser
+cache. Time-to-interactive is modelled from the measured bytes and request
+count on a throttled link (index.html, then the linked assets in parallel),
+since the deferred bundle is what makes the page interactive. The local
+wall time of the requests is reported alongside.
+
+Without --url the build in ../../dist is served in-process through
+static_assets, so no database is needed.
+
+Usage: python bench_static.py [--url http://localhost:8000] [--mbps 5] [--rtt-ms 80]
+"""
+import argparse
+import gzip
+import re
+import time
+from typing import Dict, List, Tuple
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Mount, Route
+from starlette.testclient import TestClient
+from static_assets import PrecompressedStaticFiles, asset_response, brotli, precompress
+
+ASSET_PATTERN = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+HEADER_OVERHEAD = 300  # rough bytes of response headers per request
+
+def local_app(dist_dir: str) -> Starlette:
+    """The server's static routes, without the rest of the application"""
+    precompress(dist_dir)
+
+    async def index(request: Request):
+        return asset_response(f"{dist_dir}/index.html", request.headers, request.method)
+
+    return Starlette(routes=[
+        Route("/", index),
+        Mount("/static", PrecompressedStaticFiles(directory=f"{dist_dir}/static")),
+    ])
+
+def decode(raw: bytes, encoding: str) -> str:
+    if encoding == "br":
+        raw = brotli.decompress(raw)
+    elif encoding == "gzip":
+        raw = gzip.decompress(raw)
+    return raw.decode()
+
+def fetch(client, path: str, headers: Dict, cache: Dict, use_cache: bool) -> Tuple[int, int, str]:
+    """One browser request: (requests made, bytes received, decoded body)"""
+    cached = cache.get(path) if use_cache else None
+    if cached and "immutable" in cached["cache_control"]:
+        return 0, 0, cached["body"]
+    request_headers = dict(headers)
+    if cached and cached["etag"]:
+        request_headers["If-None-Match"] = cached["etag"]
+    with client.stream("GET", path, headers=request_headers) as response:
+        raw = b"".join(response.iter_raw())
+    wire = len(raw) + HEADER_OVERHEAD
+    if response.status_code == 304:
+        return 1, wire, cached["body"]
+    body = decode(raw, response.headers.get("content-encoding", "identity"))
+    cache[path] = {
+        "etag": response.headers.get("etag"),
+        "cache_control": response.headers.get("cache-control", ""),
+        "body": body,
+    }
+    return 1, wire, body
+
+def visit(client, headers: Dict, cache: Dict, use_cache: bool, mbps: float, rtt: float) -> Dict:
+    started = time.perf_counter()
+    requests, index_bytes, html = fetch(client, "/", headers, cache, use_cache)
+    index_seconds = (rtt if requests else 0) + index_bytes * 8 / (mbps * 1e6)
+    asset_requests, asset_bytes = 0, 0
+    slowest = 0.0
+    for path in ASSET_PATTERN.findall(html):
+        made, wire, _ = fetch(client, path, headers, cache, use_cache)
+        asset_requests += made
+        asset_bytes += wire
+        slowest = max(slowest, rtt if made else 0.0)
+    # Assets share the link once index.html has arrived
+    tti = index_seconds + slowest + asset_bytes * 8 / (mbps * 1e6)
+    return {
+        "requests": requests + asset_requests,
+        "bytes": index_bytes + asset_bytes,
+        "tti": tti,
+        "wall": time.perf_counter() - started,
+    }
+
+def report(name: str, result: Dict) -> None:
+    print(f"  {name:<14} {result['requests']:3d} requests  {result['bytes'] / 1024:8.1f} KiB  "
+          f"~{result['tti'] * 1000:6.0f} ms to interactive  ({result['wall'] * 1000:.1f} ms local)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="measure a running server instead of serving ../../dist in-process")
+    parser.add_argument("--dist", default="../../dist", help="build directory for the in-process server")
+    parser.add_argument("--mbps", type=float, default=5.0, help="modelled link bandwidth in Mbit/s")
+    parser.add_argument("--rtt-ms", type=float, default=80.0, help="modelled round-trip time in ms")
+    args = parser.parse_args()
+
+    client = httpx.Client(base_url=args.url) if args.url else TestClient(local_app(args.dist))
+    rtt = args.rtt_ms / 1000
+    print(f"Home page over a {args.mbps:g} Mbit/s link with {args.rtt_ms:g} ms round trips")
+    with client:
+        setups: List[Tuple[str, Dict, bool]] = [
+            ("before", {"Accept-Encoding": "identity"}, False),
+            ("after", {"Accept-Encoding": "br, gzip"}, True),
+        ]
+        for name, headers, use_cache in setups:
+            print(name)
+            cache: Dict = {}
+            report("first visit", visit(client, headers, cache, use_cache, args.mbps, rtt))
+            report("repeat visit", visit(client, headers, cache, use_cache, args.mbps, rtt))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark for call-count storage layouts.
+Creates scratch copies of both schemas in the database from DATABASE_URL,
+each in its own schema: call_count inside the wide invitation_codes row,
+and call_count in the narrow invitation_code_usage table. Both get the
+production indexes and change tracking, since which columns are indexed
+decides whether an update can be HOT, and every increment also appends to
+the counter change log. Runs the same random increments
+against each and reports UPDATE throughput, the share of HOT updates and
+the growth of table plus index size. The scratch schemas are dropped
+afterwards.
+
+Usage: python bench_usage_table.py [--codes 1000] [--updates 20000]
+"""
+import argparse
+import random
+import time
+import psycopg
+from database import get_db_config, CODE_INDEXES_SQL, CHANGE_TRACKING_SQL
+
+WIDE_SCHEMA = "bench_usage_wide"
+NARROW_SCHEMA = "bench_usage_narrow"
+
+WIDE_TABLES_SQL = """
+    CREATE TABLE invitation_codes (
+        id SERIAL PRIMARY KEY,
+        code VARCHAR(50) UNIQUE NOT NULL,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL,
+        max_calls INTEGER NOT NULL,
+        call_count INTEGER DEFAULT 0
+    );
+"""
+
+NARROW_TABLES_SQL = """
+    CREATE TABLE invitation_codes (
+        id SERIAL PRIMARY KEY,
+        code VARCHAR(50) UNIQUE NOT NULL,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL,
+        max_calls INTEGER NOT NULL
+    );
+
+    CREATE TABLE invitation_code_usage (
+        code_id INTEGER PRIMARY KEY REFERENCES invitation_codes(id) ON DELETE CASCADE,
+        call_count INTEGER NOT NULL DEFAULT 0
+    ) WITH (fillfactor = 50);
+"""
+
+INSERT_SQL = """
+    INSERT INTO invitation_codes (code, first_name, last_name, expires_at, max_calls)
+    SELECT 'BENCH' || i, 'First' || i, 'Last' || i, now() + interval '30 days', 1000000
+    FROM generate_series(1, %s) AS i
+"""
+
+WIDE_UPDATE_SQL = """
+    UPDATE invitation_codes SET call_count = call_count + 1 WHERE code = %s
+"""
+
+NARROW_UPDATE_SQL = """
+    UPDATE invitation_code_usage u SET call_count = u.call_count + 1
+    FROM invitation_codes c WHERE c.id = u.code_id AND c.code = %s
+"""
+
+STATS_SQL = """
+    SELECT n_tup_upd, n_tup_hot_upd, pg_total_relation_size(relid) AS bytes
+    FROM pg_stat_user_tables WHERE schemaname = %s AND relname = %s
+"""
+
+def create_layout(conn, schema: str, tables_sql: str) -> None:
+    """Create a layout's tables in a fresh schema and make it the only one searched"""
+    conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    conn.execute(f"CREATE SCHEMA {schema}")
+    # Nothing below may resolve to the real tables or functions in public
+    conn.execute(f"SET search_path TO {schema}")
+    conn.execute(tables_sql)
+    for index_sql in CODE_INDEXES_SQL:
+        conn.execute(index_sql.replace(' CONCURRENTLY', ''))
+    conn.execute(CHANGE_TRACKING_SQL)
+
+def table_stats(conn, schema: str, table: str) -> dict:
+    """Update counters and size of a table, after flushing this session's statistics"""
+    try:
+        conn.execute("SELECT pg_stat_force_next_flush()")  # PostgreSQL 15+
+    except psycopg.Error:
+        time.sleep(1)  # older servers report statistics with a short delay
+    conn.execute("SELECT pg_stat_clear_snapshot()")
+    row = conn.execute(STATS_SQL, [schema, table]).fetchone()
+    return {"updates": row[0], "hot": row[1], "bytes": row[2]}
+
+def run(conn, schema: str, update_sql: str, codes, updates: int, stats_tables) -> None:
+    conn.execute(f"SET search_path TO {schema}")
+    before = {table: table_stats(conn, schema, table) for table in stats_tables}
+    started = time.perf_counter()
+    for _ in range(updates):
+        conn.execute(update_sql, [random.choice(codes)])
+    elapsed = time.perf_counter() - started
+    after = {table: table_stats(conn, schema, table) for table in stats_tables}
+
+    print(f"  {updates / elapsed:,.0f} updates/s")
+    for table in stats_tables:
+        done = after[table]["updates"] - before[table]["updates"]
+        hot = after[table]["hot"] - before[table]["hot"]
+        growth = after[table]["bytes"] - before[table]["bytes"]
+        hot_share = f"{hot / done:.0%}" if done else "n/a"
+        print(f"  {table}: {hot_share} HOT updates, "
+              f"size {before[table]['bytes'] / 1024:,.0f} KiB -> {after[table]['bytes'] / 1024:,.0f} KiB "
+              f"(+{growth / 1024:,.0f} KiB)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codes", type=int, default=1000, help="codes in each scratch table")
+    parser.add_argument("--updates", type=int, default=20_000, help="increments per layout")
+    args = parser.parse_args()
+
+    codes = [f"BENCH{i}" for i in range(1, args.codes + 1)]
+    with psycopg.connect(get_db_config(), autocommit=True) as conn:
+        try:
+            create_layout(conn, WIDE_SCHEMA, WIDE_TABLES_SQL)
+            conn.execute(INSERT_SQL, [args.codes])
+            conn.execute("ANALYZE invitation_codes")
+
+            create_layout(conn, NARROW_SCHEMA, NARROW_TABLES_SQL)
+            conn.execute(INSERT_SQL, [args.codes])
+            conn.execute("INSERT INTO invitation_code_usage (code_id) SELECT id FROM invitation_codes")
+            conn.execute("ANALYZE invitation_codes, invitation_code_usage")
+
+            print(f"call_count in invitation_codes ({args.updates:,} increments over {args.codes:,} codes)")
+            run(conn, WIDE_SCHEMA, WIDE_UPDATE_SQL, codes, args.updates, ["invitation_codes", "invitation_code_count_log"])
+            print(f"call_count in invitation_code_usage ({args.updates:,} increments over {args.codes:,} codes)")
+            run(conn, NARROW_SCHEMA, NARROW_UPDATE_SQL, codes, args.updates,
+                ["invitation_code_usage", "invitation_codes", "invitation_code_count_log"])
+        finally:
+            conn.execute(f"DROP SCHEMA IF EXISTS {WIDE_SCHEMA}, {NARROW_SCHEMA} CASCADE")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Bulk creation of invitation codes.
+Rows are streamed into a temporary staging table with COPY and moved into
+invitation_codes by a single INSERT ... ON CONFLICT DO NOTHING. Generated
+codes that collide with existing ones are regenerated and retried in the
+same transaction; codes given explicitly are reported as skipped instead.
+Used by the /api/codes/bulk endpoint and the create_codes_bulk.py CLI.
+"""
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+# No 0/O or 1/I/L, so codes survive being read aloud or copied by hand
+CODE_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+MAX_ATTEMPTS = 5
+
+STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS bulk_codes_staging (
+        code VARCHAR(50),
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        expires_at TIMESTAMP,
+        max_calls INTEGER
+    ) ON COMMIT DROP
+"""
+
+COPY_SQL = "COPY bulk_codes_staging (code, first_name, last_name, expires_at, max_calls) FROM STDIN"
+
+INSERT_SQL = """
+    INSERT INTO invitation_codes (code, first_name, last_name, expires_at, max_calls)
+    SELECT code, first_name, last_name, expires_at, max_calls FROM bulk_codes_staging
+    ON CONFLICT (code) DO NOTHING
+    RETURNING code
+"""
+
+class CodeSpaceError(Exception):
+    """Free codes could not be found within MAX_ATTEMPTS rounds"""
+
+def generate_code(length: int = 8, prefix: str = "") -> str:
+    return prefix + "".join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+def to_naive_utc(value: datetime) -> datetime:
+    """
+    expires_at is a TIMESTAMP holding UTC, and COPY would keep the wall time
+    of an aware datetime and drop its offset, so convert it first
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def prepare_rows(
+    count: int = 0,
+    rows: Optional[List[Dict]] = None,
+    days_valid: int = 30,
+    max_calls: int = 10,
+    length: int = 8,
+    prefix: str = "",
+) -> List[Dict]:
+    """
+    Build complete rows: `count` anonymous codes plus one per entry of
+    `rows`, where each entry may set code, first_name, last_name,
+    expires_at and max_calls. Generated codes are unique within the batch.
+    """
+    default_expiry = datetime.utcnow() + timedelta(days=days_valid)
+    prepared = []
+    taken: Set[str] = {row["code"] for row in rows or [] if row.get("code")}
+    for row in (rows or []) + [{}] * count:
+        code = row.get("code")
+        generated = not code
+        while not code or (generated and code in taken):
+            code = generate_code(length, prefix)
+        taken.add(code)
+        prepared.append({
+            "code": code,
+            "first_name": row.get("first_name"),
+            "last_name": row.get("last_name"),
+            "expires_at": to_naive_utc(row.get("expires_at") or default_expiry),
+            "max_calls": row["max_calls"] if row.get("max_calls") is not None else max_calls,
+            "generated": generated,
+        })
+    return prepared
+
+def _staging_row(row: Dict):
+    return (row["code"], row["first_name"], row["last_name"], row["expires_at"], row["max_calls"])
+
+def _next_attempt(pending: List[Dict], inserted: Set[str], taken: Set[str], length: int, prefix: str, result: Dict) -> List[Dict]:
+    """Record the outcome of one round and return the rows to retry with fresh codes"""
+    retry = []
+    for row in pending:
+        if row["code"] in inserted:
+            # Credit each inserted code once; a repeated explicit code is skipped
+            inserted.discard(row["code"])
+            result["created"].append({k: v for k, v in row.items() if k != "generated"})
+        elif row["generated"]:
+            code = row["code"]
+            while code in taken:
+                code = generate_code(length, prefix)
+            taken.add(code)
+            retry.append(dict(row, code=code))
+        else:
+            result["skipped"].append(row["code"])
+    return retry
+
+def _check_done(pending: List[Dict]) -> None:
+    # Raised before commit, so nothing from the batch is kept
+    if pending:
+        raise CodeSpaceError(f"Could not find free codes for {len(pending)} rows, try a longer code length")
+
+def _finish(result: Dict, started: float) -> Dict:
+    result["seconds"] = time.perf_counter() - started
+    result["codes_per_second"] = len(result["created"]) / result["seconds"] if result["seconds"] else None
+    return result
+
+def load_codes(conn, rows: List[Dict], length: int = 8, prefix: str = "") -> Dict:
+    """Insert prepared rows in one transaction on a synchronous connection"""
+    started = time.perf_counter()
+    result = {"created": [], "skipped": []}
+    taken = {row["code"] for row in rows}
+    pending = rows
+    with conn.cursor() as cur:
+        cur.execute(STAGING_SQL)
+        for _ in range(MAX_ATTEMPTS):
+            if not pending:
+                break
+            cur.execute("TRUNCATE bulk_codes_staging")
+            with cur.copy(COPY_SQL) as copy:
+                for row in pending:
+                    copy.write_row(_staging_row(row))
+            cur.execute(INSERT_SQL)
+            inserted = {record["code"] for record in cur.fetchall()}
+            pending = _next_attempt(pending, inserted, taken, length, prefix, result)
+        _check_done(pending)
+        conn.commit()
+    return _finish(result, started)
+
+async def load_codes_async(conn, rows: List[Dict], length: int = 8, prefix: str = "") -> Dict:
+    """Insert prepared rows in one transaction on an async connection"""
+    started = time.perf_counter()
+    result = {"created": [], "skipped": []}
+    taken = {row["code"] for row in rows}
+    pending = rows
+    async with conn.cursor() as cur:
+        await cur.execute(STAGING_SQL)
+        for _ in range(MAX_ATTEMPTS):
+            if not pending:
+                break
+            await cur.execute("TRUNCATE bulk_codes_staging")
+            async with cur.copy(COPY_SQL) as copy:
+                for row in pending:
+                    await copy.write_row(_staging_row(row))
+            await cur.execute(INSERT_SQL)
+            inserted = {record["code"] for record in await cur.fetchall()}
+            pending = _next_attempt(pending, inserted, taken, length, prefix, result)
+        _check_done(pending)
+        await conn.commit()
+    return _finish(result, started)
@@ -0,0 +1,217 @@
+"""
+Read-through cache of invitation code records.
+Codes rarely change after creation, so validations are served from memory.
+Entries are kept current by the invitation_codes_notify trigger (see
+migrate_add_code_notify.py) through Postgres LISTEN/NOTIFY, with a TTL as
+a fallback in case a notification is missed or the trigger is absent.
+Other channels can share the listener connection through listen().
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import psycopg
+from database import CODE_CHANGES_CHANNEL, compute_is_valid
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a timestamp from row_to_json, which trims trailing zeros from microseconds"""
+    if value is None:
+        return None
+    if "." in value:
+        whole, fraction = value.split(".", 1)
+        value = f"{whole}.{fraction.ljust(6, '0')[:6]}"
+    return datetime.fromisoformat(value)
+
+def row_from_notification(row: Dict) -> Dict:
+    """Convert a JSON row from the notify trigger back into a database record"""
+    for column in ("created_at", "expires_at"):
+        row[column] = _parse_timestamp(row.get(column))
+    return row
+
+class InvitationCodeCache:
+    def __init__(self, ttl: float = 60, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()  # code -> (stored_at, record)
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.notify_updates = 0
+        self.notify_deletes = 0
+        self.listener_connected = False
+        self.served_ages: Deque[float] = deque(maxlen=500)
+        self.notify_lags: Deque[float] = deque(maxlen=500)
+        self._task: Optional[asyncio.Task] = None
+        # Loads racing with changes: a load result is only cached if the code
+        # did not change while it was in flight
+        self._generation = 0
+        self._cleared_at = 0
+        self._loading: Dict[str, int] = {}  # code -> loads in flight
+        self._changed_at: Dict[str, int] = {}  # code -> generation of its last change, while loading
+        # Called with (op, row) for every notification, and ("RESYNC", None)
+        # whenever notifications may have been missed
+        self.subscribers: List[Callable[[str, Optional[Dict]], None]] = []
+        # Extra channels on the same connection: channel -> handler
+        self.channels: Dict[str, Callable[[Optional[str]], None]] = {}
+
+    def subscribe(self, callback: Callable[[str, Optional[Dict]], None]) -> None:
+        self.subscribers.append(callback)
+
+    def listen(self, channel: str, handler: Callable[[Optional[str]], None]) -> None:
+        """
+        Pass the payload of every notification on another channel to
+        handler, and None whenever notifications may have been missed.
+        Register before start().
+        """
+        self.channels[channel] = handler
+
+    def _notify_channel(self, channel: str, payload: Optional[str]) -> None:
+        try:
+            self.channels[channel](payload)
+        except Exception as e:
+            print(f"Handler for {channel} notifications failed: {e}")
+
+    def _publish(self, op: str, row: Optional[Dict]) -> None:
+        for callback in self.subscribers:
+            try:
+                callback(op, row)
+            except Exception as e:
+                print(f"Code change subscriber failed: {e}")
+
+    def _mark_changed(self, code: Optional[str] = None) -> None:
+        self._generation += 1
+        if code is None:
+            self._cleared_at = self._generation
+        elif code in self._loading:
+            self._changed_at[code] = self._generation
+
+    def put(self, record: Dict) -> None:
+        """Store or refresh a record, e.g. one returned by the atomic consume"""
+        record = {k: v for k, v in record.items() if k != 'is_valid'}
+        self._mark_changed(record['code'])
+        self.entries[record['code']] = (time.monotonic(), record)
+        self.entries.move_to_end(record['code'])
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, code: Optional[str] = None) -> None:
+        """Drop one code, or every code if none is given"""
+        self._mark_changed(code)
+        if code is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(code, None)
+
+    async def get(self, code: str, loader: Callable[[str], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        """Get a code with a freshly computed is_valid, loading it on a miss"""
+        entry = self.entries.get(code)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                self.served_ages.append(age)
+                self.entries.move_to_end(code)
+                record = dict(entry[1])
+                record['is_valid'] = compute_is_valid(record)
+                return record
+            self.expirations += 1
+            del self.entries[code]
+
+        self.misses += 1
+        started = self._generation
+        self._loading[code] = self._loading.get(code, 0) + 1
+        try:
+            record = await loader(code)
+        finally:
+            changed = max(self._cleared_at, self._changed_at.get(code, 0)) > started
+            self._loading[code] -= 1
+            if not self._loading[code]:
+                del self._loading[code]
+                self._changed_at.pop(code, None)
+        # A change that arrived during the load may be newer than what it read
+        if record is not None and not changed:
+            self.put(record)
+        return record
+
+    def apply_notification(self, payload: str) -> None:
+        """Refresh or drop a cached code from a trigger notification"""
+        message = json.loads(payload)
+        self.notify_lags.append(max(0.0, time.time() - message['ts']))
+        row = row_from_notification(message['row'])
+        code = row['code']
+        self._mark_changed(code)
+        if message['op'] == 'DELETE':
+            self.notify_deletes += 1
+            self.invalidate(code)
+        elif code in self.entries:
+            self.notify_updates += 1
+            self.put(row)
+        self._publish(message['op'], row)
+
+    async def _listen(self, conninfo: str) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CODE_CHANGES_CHANNEL}")
+                    for channel in self.channels:
+                        await conn.execute(f"LISTEN {channel}")
+                    # Anything cached before now may have missed a notification
+                    self.invalidate()
+                    self._publish("RESYNC", None)
+                    for channel in self.channels:
+                        self._notify_channel(channel, None)
+                    self.listener_connected = True
+                    print(f"Invitation code cache listening on {', '.join([CODE_CHANGES_CHANNEL, *self.channels])}")
+                    async for notify in conn.notifies():
+                        if notify.channel in self.channels:
+                            self._notify_channel(notify.channel, notify.payload)
+                            continue
+                        try:
+                            self.apply_notification(notify.payload)
+                        except (ValueError, KeyError) as e:
+                            print(f"Ignoring malformed code notification: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Invitation code cache listener error, retrying: {e}")
+            self.listener_connected = False
+            await asyncio.sleep(5)
+
+    def start(self, conninfo: str) -> None:
+        """Start listening for change notifications"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(conninfo))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.listener_connected = False
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        lags = sorted(self.notify_lags)
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "ttl_expirations": self.expirations,
+            "notify_updates": self.notify_updates,
+            "notify_deletes": self.notify_deletes,
+            "listener_connected": self.listener_connected,
+            "served_age_max": max(self.served_ages) if self.served_ages else None,
+            "notify_lag_p95": lags[int(len(lags) * 0.95)] if lags else None,
+        }
+
+code_cache = InvitationCodeCache(
+    ttl=float(os.getenv("CODE_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("CODE_CACHE_MAX_ENTRIES", "10000")),
+)
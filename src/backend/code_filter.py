@@ -0,0 +1,179 @@
+"""
+In-memory Bloom filter of all existing invitation codes.
+Lets the API reject codes that do not exist in microseconds, before any
+cache or database access, so guessing random codes costs CPU instead of
+database connections. Built at startup, updated as codes are created, and
+rebuilt whenever change notifications may have been missed.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = max(capacity, 1)
+        self.fp_rate = fp_rate
+        self.bits = max(8, math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two independent 64-bit halves
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        array = self.array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def expected_fp_rate(self) -> float:
+        """Theoretical false positive rate at the current fill"""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+class CodeFilter:
+    """
+    Bloom filter over invitation codes with rebuild support and accuracy
+    metrics. Until the first build completes every code is let through.
+    """
+    def __init__(self, fp_rate: float = 0.001, min_capacity: int = 10_000, refresh_interval: float = 300):
+        self.fp_rate = fp_rate
+        self.min_capacity = min_capacity
+        self.refresh_interval = refresh_interval
+        self.filter: Optional[BloomFilter] = None
+        self.rejected = 0
+        self.passed = 0
+        self.false_positives = 0
+        self.builds = 0
+        self.last_build_seconds: Optional[float] = None
+        self._load_codes: Optional[Callable[[], AsyncIterator[str]]] = None
+        self._build_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._pending: Optional[List[str]] = None  # codes added while a build is running
+
+    def might_exist(self, code: str) -> bool:
+        """False only if the code certainly does not exist"""
+        if self.filter is None:
+            return True
+        if code in self.filter:
+            self.passed += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_false_positive(self) -> None:
+        """Called when a code that passed the filter turned out not to exist"""
+        self.false_positives += 1
+
+    def add(self, code: str) -> None:
+        if self._pending is not None:
+            # The running build may have read the table before this code existed
+            self._pending.append(code)
+        if self.filter is None:
+            return
+        self.filter.add(code)
+        if self.filter.count > self.filter.capacity:
+            # Past capacity the false positive rate climbs; rebuild at double size
+            self.schedule_rebuild()
+
+    async def build(self, load_codes: Callable[[], AsyncIterator[str]]) -> bool:
+        """Build a new filter from every existing code and swap it in; False if loading failed"""
+        self._load_codes = load_codes
+        return await self._start_build()
+
+    def _start_build(self) -> asyncio.Task:
+        # Builds never overlap: callers share the one already running
+        if self._build_task is None or self._build_task.done():
+            self._build_task = asyncio.create_task(self._build(self._load_codes))
+        return self._build_task
+
+    async def _build(self, load_codes: Callable[[], AsyncIterator[str]]) -> bool:
+        started = time.monotonic()
+        pending: List[str] = []
+        self._pending = pending
+        try:
+            codes = [code async for code in load_codes()]
+            bloom = BloomFilter(max(self.min_capacity, 2 * len(codes)), self.fp_rate)
+            for code in codes + pending:
+                bloom.add(code)
+        except Exception as e:
+            print(f"Invitation code filter build failed: {e}")
+            return False
+        finally:
+            if self._pending is pending:
+                self._pending = None
+        self.filter = bloom
+        self.builds += 1
+        self.last_build_seconds = time.monotonic() - started
+        print(f"Invitation code filter built with {bloom.count} codes in {self.last_build_seconds:.2f}s")
+        return True
+
+    def schedule_rebuild(self) -> None:
+        """Rebuild in the background, e.g. after missed change notifications"""
+        if self._load_codes is not None:
+            self._start_build()
+
+    async def _refresh(self) -> None:
+        # Safety net for codes whose notification never arrived
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self._start_build()
+
+    async def start(self, load_codes: Callable[[], AsyncIterator[str]]) -> None:
+        """Build the filter and keep it refreshed; failures leave it disabled"""
+        if not await self.build(load_codes):
+            print("Invitation code filter disabled, could not load codes")
+            return
+        if self.refresh_interval > 0 and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def stop(self) -> None:
+        for task in (self._refresh_task, self._build_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = None
+        self._build_task = None
+
+    def on_code_change(self, op: str, row: Optional[Dict]) -> None:
+        """code_cache subscriber: add new codes, rebuild after a resync"""
+        if op == "INSERT":
+            self.add(row["code"])
+        elif op == "RESYNC":
+            self.schedule_rebuild()
+
+    def get_stats(self) -> Dict:
+        bloom = self.filter
+        misses = self.rejected + self.false_positives
+        return {
+            "ready": bloom is not None,
+            "codes": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "hash_functions": bloom.hashes if bloom else 0,
+            "memory_bytes": len(bloom.array) if bloom else 0,
+            "expected_fp_rate": bloom.expected_fp_rate() if bloom else None,
+            "observed_fp_rate": self.false_positives / misses if misses else None,
+            "rejected": self.rejected,
+            "passed": self.passed,
+            "false_positives": self.false_positives,
+            "builds": self.builds,
+            "last_build_seconds": self.last_build_seconds,
+        }
+
+code_filter = CodeFilter(
+    fp_rate=float(os.getenv("CODE_FILTER_FP_RATE", "0.001")),
+    refresh_interval=float(os.getenv("CODE_FILTER_REFRESH_SECONDS", "300")),
+)
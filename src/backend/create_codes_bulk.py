@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Create invitation codes in bulk, e.g. for a whole school district.
+
+Usage:
+    python create_codes_bulk.py --count 5000 --days 90 --max-calls 20
+    python create_codes_bulk.py --csv students.csv --output created.csv
+
+The input CSV needs a header; recognised columns are code, first_name,
+last_name, expires_at (ISO date, naive times are UTC) and max_calls. Missing codes are generated.
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime
+from database import get_db_connection
+from bulk_codes import prepare_rows, load_codes, CodeSpaceError
+
+def read_rows(path: str):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield {
+                "code": (row.get("code") or "").strip() or None,
+                "first_name": (row.get("first_name") or "").strip() or None,
+                "last_name": (row.get("last_name") or "").strip() or None,
+                "expires_at": datetime.fromisoformat(row["expires_at"]) if row.get("expires_at") else None,
+                "max_calls": int(row["max_calls"]) if row.get("max_calls") else None,
+            }
+
+def write_rows(path: str, rows) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["code", "first_name", "last_name", "expires_at", "max_calls"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=0, help="codes to generate without names")
+    parser.add_argument("--csv", help="CSV file with one row per code to create")
+    parser.add_argument("--days", type=int, default=30, help="days until codes expire, unless the CSV sets expires_at")
+    parser.add_argument("--max-calls", type=int, default=10, help="calls per code, unless the CSV sets max_calls")
+    parser.add_argument("--length", type=int, default=8, help="random characters per generated code")
+    parser.add_argument("--prefix", default="", help="prefix for generated codes")
+    parser.add_argument("--output", help="write the created codes to this CSV file")
+    args = parser.parse_args()
+
+    rows = list(read_rows(args.csv)) if args.csv else []
+    if not args.count and not rows:
+        parser.error("nothing to create, pass --count or --csv")
+
+    prepared = prepare_rows(args.count, rows, args.days, args.max_calls, args.length, args.prefix)
+    try:
+        with get_db_connection(quiet=True) as conn:
+            result = load_codes(conn, prepared, args.length, args.prefix)
+    except CodeSpaceError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Created {len(result['created'])} codes in {result['seconds']:.2f}s "
+          f"({result['codes_per_second'] or 0:,.0f} codes/s)")
+    if result["skipped"]:
+        print(f"Skipped {len(result['skipped'])} codes that already exist: {', '.join(result['skipped'][:10])}"
+              + (" ..." if len(result["skipped"]) > 10 else ""))
+    if args.output:
+        write_rows(args.output, result["created"])
+        print(f"Wrote created codes to {args.output}")
+    elif len(result["created"]) <= 20:
+        for row in result["created"]:
+            print(f"  {row['code']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from database import get_db_connection
+from bulk_codes import prepare_rows, load_codes
 from datetime import datetime, timedelta
 
 def create_test_code(code="TEST123", first_name=None, last_name=None, days_valid=7, max_calls=10):
@@ -45,8 +46,21 @@ def create_sample_codes():
     ]
     
     print("Creating sample invitation codes...")
-    for code, first_name, last_name in sample_codes:
-        create_test_code(code, first_name, last_name)
+    rows = prepare_rows(
+        rows=[{"code": code, "first_name": first_name, "last_name": last_name}
+              for code, first_name, last_name in sample_codes],
+        days_valid=7,
+        max_calls=10,
+    )
+    try:
+        with get_db_connection() as conn:
+            result = load_codes(conn, rows)
+        for row in result["created"]:
+            print(f"Test code '{row['code']}' created successfully")
+        for code in result["skipped"]:
+            print(f"Test code '{code}' already exists")
+    except Exception as e:
+        print(f"Error creating sample codes: {e}")
 
 if __name__ == "__main__":
     import sys
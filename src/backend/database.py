@@ -1,10 +1,15 @@
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+import atexit
 import os
+import base64
+import binascii
+import json
 from datetime import datetime
 from urllib.parse import urlparse
 from dotenv import load_dotenv
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from contextlib import contextmanager
 
 # Load environment variables
@@ -18,14 +23,63 @@ def get_db_config() -> str:
         raise ValueError("DATABASE_URL environment variable is not set")
     return database_url
 
+def get_pool_config() -> Dict:
+    """Get connection pool settings from environment variables"""
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    }
+
+# Shared pool for synchronous callers: the CLI scripts and one-time setup
+# such as auth.init_admin_table. Request handlers use the async pool in
+# database_async. Opened on first use and closed when the process exits.
+_pool: Optional[ConnectionPool] = None
+
+def _reset_connection(conn: psycopg.Connection) -> None:
+    # Scripts that build indexes concurrently switch to autocommit
+    conn.autocommit = False
+
+def open_db_pool() -> ConnectionPool:
+    """Open the shared connection pool"""
+    global _pool
+    if _pool is None:
+        config = get_pool_config()
+        _pool = ConnectionPool(
+            get_db_config(),
+            kwargs={"row_factory": dict_row},
+            check=ConnectionPool.check_connection,
+            reset=_reset_connection,
+            open=False,
+            name="voiceai",
+            **config
+        )
+        _pool.open(wait=True, timeout=config["timeout"])
+        atexit.register(close_db_pool)
+    return _pool
+
+def close_db_pool() -> None:
+    """Close the shared connection pool"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+def get_pool_stats() -> Dict:
+    """Get connection pool statistics, empty if the pool is not open"""
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
 @contextmanager
 def get_db_connection(quiet: bool = False):
-    """Create and return a database connection"""
+    """Get a database connection from the shared pool, opening it on first use"""
     try:
-        conninfo = get_db_config()
         if not quiet:
-            print(f"Attempting to connect to database: {conninfo}")
-        with psycopg.connect(conninfo, row_factory=dict_row) as conn:
+            print(f"Attempting to connect to database: {get_db_config()}")
+        pool = open_db_pool()
+        with pool.connection() as conn:
             if not quiet:
                 print("Database connection successful")
             yield conn
@@ -33,6 +87,282 @@ def get_db_connection(quiet: bool = False):
         print(f"Error connecting to database: {e}")
         raise
 
+# Notification channel for invitation code changes, consumed by code_cache
+CODE_CHANGES_CHANNEL = "invitation_codes_changed"
+
+# Publishes every insert, update and delete of an invitation code with the
+# full row, so listeners can refresh their copy without querying
+CODE_NOTIFY_TRIGGER_SQL = f'''
+    CREATE OR REPLACE FUNCTION notify_invitation_code_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify(
+            '{CODE_CHANGES_CHANNEL}',
+            json_build_object(
+                'op', TG_OP,
+                'ts', extract(epoch FROM clock_timestamp()),
+                'row', row_to_json(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END)
+            )::text
+        );
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS invitation_codes_notify ON invitation_codes;
+    CREATE TRIGGER invitation_codes_notify
+        AFTER INSERT OR UPDATE OR DELETE ON invitation_codes
+        FOR EACH ROW EXECUTE FUNCTION notify_invitation_code_change();
+'''
+
+CODE_NOTIFY_INSTALLED_SQL = """
+    SELECT EXISTS (
+        SELECT FROM pg_trigger
+        WHERE tgname = 'invitation_codes_notify' AND tgrelid = 'invitation_codes'::regclass
+    ) AS installed
+"""
+
+# Notification channel for admin changes, consumed by the admin principal cache in auth
+ADMIN_CHANGES_CHANNEL = "admins_changed"
+
+# Publishes the username of every admin created, changed or deleted
+ADMIN_NOTIFY_TRIGGER_SQL = f'''
+    CREATE OR REPLACE FUNCTION notify_admin_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify(
+            '{ADMIN_CHANGES_CHANNEL}',
+            CASE WHEN TG_OP = 'INSERT' THEN NEW.username ELSE OLD.username END
+        );
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS admins_notify ON admins;
+    CREATE TRIGGER admins_notify
+        AFTER INSERT OR UPDATE OR DELETE ON admins
+        FOR EACH ROW EXECUTE FUNCTION notify_admin_change();
+'''
+
+ADMIN_NOTIFY_INSTALLED_SQL = """
+    SELECT EXISTS (
+        SELECT FROM pg_trigger
+        WHERE tgname = 'admins_notify' AND tgrelid = to_regclass('admins')
+    ) AS installed
+"""
+
+# Schema option: keep call_count in the narrow invitation_code_usage table
+# instead of invitation_codes (see migrate_split_usage.py)
+USAGE_TABLE = os.getenv("CODE_USAGE_TABLE", "0") == "1"
+
+# Frequently updated counters live apart from the code metadata. The table is
+# only two integers wide with free space left on every page and no index on
+# call_count, so increments are HOT updates that never touch an index.
+USAGE_TABLE_SQL = f'''
+    CREATE TABLE IF NOT EXISTS invitation_code_usage (
+        code_id INTEGER PRIMARY KEY REFERENCES invitation_codes(id) ON DELETE CASCADE,
+        call_count INTEGER NOT NULL DEFAULT 0
+    ) WITH (fillfactor = 50);
+
+    CREATE OR REPLACE FUNCTION create_invitation_code_usage() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO invitation_code_usage (code_id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS invitation_codes_usage_row ON invitation_codes;
+    CREATE TRIGGER invitation_codes_usage_row
+        AFTER INSERT ON invitation_codes
+        FOR EACH ROW EXECUTE FUNCTION create_invitation_code_usage();
+
+    -- Notifications carry the merged row, as they did before the split
+    CREATE OR REPLACE FUNCTION notify_invitation_code_change() RETURNS trigger AS $$
+    DECLARE
+        code_row jsonb;
+    BEGIN
+        IF TG_TABLE_NAME = 'invitation_code_usage' THEN
+            SELECT to_jsonb(c) INTO code_row FROM invitation_codes c WHERE c.id = NEW.code_id;
+            code_row := code_row || jsonb_build_object('call_count', NEW.call_count);
+        ELSE
+            IF TG_OP = 'DELETE' THEN
+                code_row := to_jsonb(OLD);
+            ELSE
+                code_row := to_jsonb(NEW);
+            END IF;
+            code_row := code_row || jsonb_build_object('call_count', COALESCE(
+                (SELECT call_count FROM invitation_code_usage WHERE code_id = (code_row->>'id')::int), 0
+            ));
+        END IF;
+        PERFORM pg_notify(
+            '{CODE_CHANGES_CHANNEL}',
+            json_build_object(
+                'op', TG_OP,
+                'ts', extract(epoch FROM clock_timestamp()),
+                'row', code_row
+            )::text
+        );
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS invitation_code_usage_notify ON invitation_code_usage;
+    CREATE TRIGGER invitation_code_usage_notify
+        AFTER UPDATE ON invitation_code_usage
+        FOR EACH ROW EXECUTE FUNCTION notify_invitation_code_change();
+'''
+
+# Change tracking: rows record the id of the transaction that last changed
+# them, and deleted codes leave a tombstone. Clients sync with a watermark,
+# the oldest transaction still running when they read (the snapshot xmin):
+# everything below it had finished, so asking again for changes at or above
+# it cannot miss a transaction that commits late. Only the listed metadata
+# columns mark a code row changed, so call count increments stay HOT updates.
+# Counter changes are appended to invitation_code_count_log instead: an
+# insert-only table whose only index is on change_xid, so the hot row gains
+# no indexed column and the log needs no update or upsert. The log is pruned
+# by prune_count_log; syncing from a version older than what it still holds
+# needs a full reload. Columns are filled by triggers, so every writer
+# (server, CLI, psql) is covered. Transaction ids need PostgreSQL 13 or later.
+CURRENT_XID_SQL = 'pg_current_xact_id()::text::bigint'
+WATERMARK_SQL = 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
+
+CHANGE_TRACKING_SQL = f'''
+    -- Replaces the change_seq sequence of earlier versions, and their
+    -- invitation_code_count_changes table, whose upserts rewrote an indexed
+    -- column on every call count increment
+    DROP TRIGGER IF EXISTS invitation_codes_change_seq ON invitation_codes;
+    ALTER TABLE invitation_codes DROP COLUMN IF EXISTS change_seq;
+    DO $$
+    BEGIN
+        IF to_regclass('invitation_code_usage') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS invitation_code_usage_change_seq ON invitation_code_usage;
+            ALTER TABLE invitation_code_usage DROP COLUMN IF EXISTS change_seq;
+        END IF;
+    END;
+    $$;
+    DROP FUNCTION IF EXISTS bump_invitation_code_change_seq();
+    DROP TABLE IF EXISTS invitation_code_count_changes;
+
+    -- Existing rows count as changed long ago
+    ALTER TABLE invitation_codes ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL DEFAULT 0;
+    ALTER TABLE invitation_codes ALTER COLUMN change_xid SET DEFAULT {CURRENT_XID_SQL};
+    CREATE INDEX IF NOT EXISTS invitation_codes_change_xid_idx ON invitation_codes (change_xid);
+    -- Lets the version check notice codes expiring, which changes no row
+    CREATE INDEX IF NOT EXISTS invitation_codes_expires_at_idx ON invitation_codes (expires_at);
+
+    CREATE OR REPLACE FUNCTION mark_invitation_code_changed() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_xid := {CURRENT_XID_SQL};
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS invitation_codes_change_xid ON invitation_codes;
+    CREATE TRIGGER invitation_codes_change_xid
+        BEFORE UPDATE ON invitation_codes
+        FOR EACH ROW
+        WHEN ((OLD.code, OLD.first_name, OLD.last_name, OLD.created_at, OLD.expires_at, OLD.max_calls)
+              IS DISTINCT FROM (NEW.code, NEW.first_name, NEW.last_name, NEW.created_at, NEW.expires_at, NEW.max_calls))
+        EXECUTE FUNCTION mark_invitation_code_changed();
+
+    -- Append-only, no primary key or foreign key: one index insert per change
+    CREATE TABLE IF NOT EXISTS invitation_code_count_log (
+        code_id INTEGER NOT NULL,
+        change_xid BIGINT NOT NULL DEFAULT {CURRENT_XID_SQL}
+    );
+    CREATE INDEX IF NOT EXISTS invitation_code_count_log_change_xid_idx ON invitation_code_count_log (change_xid);
+
+    -- Versions below pruned_below may have lost counter changes. Each prune
+    -- drops the log below the watermark recorded by the previous one.
+    CREATE TABLE IF NOT EXISTS invitation_code_count_log_state (
+        pruned_below BIGINT NOT NULL,
+        next_horizon BIGINT NOT NULL,
+        next_horizon_at TIMESTAMP WITH TIME ZONE NOT NULL
+    );
+    -- Counter changes made before the log existed were not recorded
+    INSERT INTO invitation_code_count_log_state (pruned_below, next_horizon, next_horizon_at)
+    SELECT {WATERMARK_SQL}, {WATERMARK_SQL}, now()
+    WHERE NOT EXISTS (SELECT FROM invitation_code_count_log_state);
+
+    CREATE OR REPLACE FUNCTION record_invitation_code_count_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_TABLE_NAME = 'invitation_code_usage' THEN
+            INSERT INTO invitation_code_count_log (code_id) VALUES (NEW.code_id);
+        ELSE
+            INSERT INTO invitation_code_count_log (code_id) VALUES (NEW.id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- On whichever table holds call_count
+    DO $$
+    BEGIN
+        DROP TRIGGER IF EXISTS invitation_codes_count_change ON invitation_codes;
+        IF to_regclass('invitation_code_usage') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS invitation_code_usage_count_change ON invitation_code_usage;
+            CREATE TRIGGER invitation_code_usage_count_change
+                AFTER UPDATE ON invitation_code_usage
+                FOR EACH ROW WHEN (OLD.call_count IS DISTINCT FROM NEW.call_count)
+                EXECUTE FUNCTION record_invitation_code_count_change();
+        ELSE
+            CREATE TRIGGER invitation_codes_count_change
+                AFTER UPDATE ON invitation_codes
+                FOR EACH ROW WHEN (OLD.call_count IS DISTINCT FROM NEW.call_count)
+                EXECUTE FUNCTION record_invitation_code_count_change();
+        END IF;
+    END;
+    $$;
+
+    CREATE TABLE IF NOT EXISTS invitation_code_deletions (
+        code VARCHAR(50) NOT NULL
+    );
+    DROP INDEX IF EXISTS invitation_code_deletions_change_seq_idx;
+    ALTER TABLE invitation_code_deletions DROP COLUMN IF EXISTS change_seq;
+    ALTER TABLE invitation_code_deletions ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL DEFAULT 0;
+    ALTER TABLE invitation_code_deletions ALTER COLUMN change_xid SET DEFAULT {CURRENT_XID_SQL};
+    CREATE INDEX IF NOT EXISTS invitation_code_deletions_change_xid_idx ON invitation_code_deletions (change_xid);
+
+    CREATE OR REPLACE FUNCTION record_invitation_code_deletion() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO invitation_code_deletions (code) VALUES (OLD.code);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS invitation_codes_deletion ON invitation_codes;
+    CREATE TRIGGER invitation_codes_deletion
+        AFTER DELETE ON invitation_codes
+        FOR EACH ROW EXECUTE FUNCTION record_invitation_code_deletion();
+
+    DROP SEQUENCE IF EXISTS invitation_codes_change_seq;
+'''
+
+def create_code_tables(cur) -> None:
+    """
+    Create invitation_codes with every index and trigger the migrations add
+    to an existing table, so a fresh database matches a migrated one. Run
+    inside a transaction on a database without the table.
+    """
+    cur.execute('''
+        CREATE TABLE invitation_codes (
+            id SERIAL PRIMARY KEY,
+            code VARCHAR(50) UNIQUE NOT NULL,
+            first_name VARCHAR(100),
+            last_name VARCHAR(100),
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            max_calls INTEGER NOT NULL,
+            call_count INTEGER DEFAULT 0
+        )
+    ''')
+    # The table is empty, so the indexes can be built in this transaction
+    for index_sql in CODE_INDEXES_SQL:
+        cur.execute(index_sql.replace(' CONCURRENTLY', ''))
+    cur.execute(CODE_NOTIFY_TRIGGER_SQL)
+    if USAGE_TABLE:
+        cur.execute(USAGE_TABLE_SQL)
+        cur.execute("ALTER TABLE invitation_codes DROP COLUMN call_count")
+    cur.execute(CHANGE_TRACKING_SQL)
+
 def init_db():
     """Initialize the database with required tables"""
     print("Initializing database...")
@@ -51,21 +381,7 @@ def init_db():
                 
                 if not tables_exist:
                     print("Creating database tables...")
-                    
-                    # Create invitation_codes table
-                    cur.execute('''
-                        CREATE TABLE IF NOT EXISTS invitation_codes (
-                            id SERIAL PRIMARY KEY,
-                            code VARCHAR(50) UNIQUE NOT NULL,
-                            first_name VARCHAR(100),
-                            last_name VARCHAR(100),
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            expires_at TIMESTAMP NOT NULL,
-                            max_calls INTEGER NOT NULL,
-                            call_count INTEGER DEFAULT 0
-                        )
-                    ''')
-                    
+                    create_code_tables(cur)
                     conn.commit()
                     print("Database tables created successfully!")
                 else:
@@ -75,21 +391,210 @@ def init_db():
         print(f"Error during database initialization: {e}")
         raise
 
+def compute_is_valid(code: Dict) -> bool:
+    """Whether an invitation code record is unexpired and has calls left"""
+    return (
+        datetime.utcnow() < code['expires_at'] and
+        code['call_count'] < code['max_calls']
+    )
+
+# Full invitation code records, including call_count wherever it is stored
+if USAGE_TABLE:
+    CODES_FROM_SQL = 'invitation_codes c JOIN invitation_code_usage u ON u.code_id = c.id'
+    CALL_COUNT_COLUMN = 'u.call_count'
+    SELECT_CODES_SQL = f'SELECT c.*, u.call_count FROM {CODES_FROM_SQL}'
+else:
+    CODES_FROM_SQL = 'invitation_codes c'
+    CALL_COUNT_COLUMN = 'c.call_count'
+    SELECT_CODES_SQL = f'SELECT * FROM {CODES_FROM_SQL}'
+
+# Columns that can be requested from the code listing, in display order
+CODE_FIELDS = {
+    'id': 'c.id',
+    'code': 'c.code',
+    'first_name': 'c.first_name',
+    'last_name': 'c.last_name',
+    'created_at': 'c.created_at',
+    'expires_at': 'c.expires_at',
+    'max_calls': 'c.max_calls',
+    'call_count': CALL_COUNT_COLUMN,
+    'is_valid': f'(c.expires_at > %(now)s AND {CALL_COUNT_COLUMN} < c.max_calls)',
+}
+
+# Status filters, matching the rejection reasons of get_rejection_reason
+CODE_STATUS_FILTERS = {
+    'valid': f'c.expires_at > %(now)s AND {CALL_COUNT_COLUMN} < c.max_calls',
+    'expired': 'c.expires_at <= %(now)s',
+    'exhausted': f'c.expires_at > %(now)s AND {CALL_COUNT_COLUMN} >= c.max_calls',
+}
+
+# Indexes behind the listing: keyset order, and prefix searches that work
+# in any collation
+CODE_INDEXES_SQL = [
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS invitation_codes_created_id_idx ON invitation_codes (created_at, id)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS invitation_codes_code_prefix_idx ON invitation_codes (code varchar_pattern_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS invitation_codes_first_name_prefix_idx ON invitation_codes (lower(first_name) varchar_pattern_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS invitation_codes_last_name_prefix_idx ON invitation_codes (lower(last_name) varchar_pattern_ops)',
+]
+
+# Drops counter log entries older than the previous prune's watermark once
+# `retention` has passed since it, so entries are kept between one and two
+# retention periods. Only the index range below the horizon is touched.
+PRUNE_COUNT_LOG_SQL = f'''
+    WITH state AS (
+        UPDATE invitation_code_count_log_state
+        SET pruned_below = next_horizon, next_horizon = {WATERMARK_SQL}, next_horizon_at = now() + %(retention)s
+        WHERE next_horizon_at <= now()
+        RETURNING pruned_below
+    )
+    DELETE FROM invitation_code_count_log WHERE change_xid < (SELECT pruned_below FROM state)
+'''
+
+COUNT_LOG_HORIZON_SQL = 'SELECT pruned_below FROM invitation_code_count_log_state'
+
+# Current change version: the watermark, a fingerprint of every change at or
+# above it, and the latest expiry that has passed, since a code expiring
+# changes is_valid without touching its row. Transactions below the watermark
+# have finished, so two reads with the same version saw the same data. Each
+# part is an index range scan over recent changes only.
+CHANGE_VERSION_SQL = f'''
+    WITH watermark AS (SELECT {WATERMARK_SQL} AS xid),
+    recent AS (
+        SELECT 'c' || id || ':' || change_xid AS change FROM invitation_codes
+        WHERE change_xid >= (SELECT xid FROM watermark)
+        UNION ALL
+        SELECT 'u' || code_id || ':' || change_xid FROM invitation_code_count_log
+        WHERE change_xid >= (SELECT xid FROM watermark)
+        UNION ALL
+        SELECT 'd' || code || ':' || change_xid FROM invitation_code_deletions
+        WHERE change_xid >= (SELECT xid FROM watermark)
+    )
+    SELECT
+        (SELECT xid FROM watermark) AS version,
+        (SELECT count(*) || ':' || COALESCE(sum(hashtextextended(change, 0)), 0) FROM recent) AS recent,
+        (SELECT max(expires_at) FROM invitation_codes WHERE expires_at <= %(now)s) AS last_expiry
+'''
+
+# Codes whose metadata or counter changed in a transaction at or above the
+# watermark `since`, in (change_xid, id) order for paging
+CODE_CHANGES_SQL = f'''
+    WITH changed AS (
+        SELECT id AS code_id, change_xid FROM invitation_codes WHERE change_xid >= %(since)s
+        UNION ALL
+        SELECT code_id, change_xid FROM invitation_code_count_log WHERE change_xid >= %(since)s
+    ),
+    latest AS (
+        SELECT code_id, max(change_xid) AS change_xid FROM changed GROUP BY code_id
+    )
+    SELECT {', '.join(f'{sql} AS {field}' for field, sql in CODE_FIELDS.items())},
+        l.change_xid
+    FROM latest l JOIN {CODES_FROM_SQL} ON c.id = l.code_id
+    WHERE (l.change_xid, c.id) > (%(after_xid)s, %(after_id)s)
+    ORDER BY l.change_xid, c.id
+    LIMIT %(limit)s
+'''
+
+# Deleted codes that have not been created again since
+CODE_DELETIONS_SQL = '''
+    SELECT DISTINCT d.code FROM invitation_code_deletions d
+    WHERE d.change_xid >= %(since)s
+    AND NOT EXISTS (SELECT FROM invitation_codes c WHERE c.code = d.code)
+'''
+
+CHANGE_WATERMARK_SQL = f'SELECT {WATERMARK_SQL} AS xid'
+
+class ChangeHistoryExpiredError(Exception):
+    """Raised when changes are asked for since a version older than the pruned counter log"""
+
+def encode_change_cursor(since: int, watermark: int, after_xid: int, after_id: int) -> str:
+    """Cursor for the next page of changes: the original watermark, the one to return once done, and the last row"""
+    return f"{since}.{watermark}.{after_xid}.{after_id}"
+
+def decode_change_cursor(cursor: str) -> Tuple[int, Optional[int], int, int]:
+    """
+    (since, watermark, after_xid, after_id) for a cursor from
+    /api/codes/changes or a version from /api/codes; raises ValueError
+    """
+    try:
+        parts = [int(part) for part in cursor.split('.')]
+    except ValueError:
+        raise ValueError(f"Invalid change cursor: {cursor}")
+    if len(parts) == 1 and parts[0] >= 0:
+        return parts[0], None, -1, -1
+    if len(parts) == 4:
+        return parts[0], parts[1], parts[2], parts[3]
+    raise ValueError(f"Invalid change cursor: {cursor}")
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Opaque cursor pointing just past a row in (created_at, id) order"""
+    raw = json.dumps([created_at.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except (TypeError, binascii.Error, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def _escape_like(prefix: str) -> str:
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def build_codes_query(
+    fields: Optional[List[str]] = None,
+    status: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    code_prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[str, Dict]:
+    """
+    Build the code listing query, newest first in (created_at, id) order.
+    Rows also carry cursor_created_at and cursor_id for paging; without a
+    limit every matching row is returned.
+    """
+    fields = fields or list(CODE_FIELDS)
+    unknown = [field for field in fields if field not in CODE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if status is not None and status not in CODE_STATUS_FILTERS:
+        raise ValueError(f"Unknown status: {status}")
+
+    params: Dict = {'now': datetime.utcnow()}
+    conditions = []
+    if status:
+        conditions.append(CODE_STATUS_FILTERS[status])
+    if name_prefix:
+        params['name_prefix'] = _escape_like(name_prefix.lower()) + '%'
+        conditions.append('(lower(c.first_name) LIKE %(name_prefix)s OR lower(c.last_name) LIKE %(name_prefix)s)')
+    if code_prefix:
+        params['code_prefix'] = _escape_like(code_prefix) + '%'
+        conditions.append('c.code LIKE %(code_prefix)s')
+    if cursor:
+        params['cursor_created_at'], params['cursor_id'] = decode_cursor(cursor)
+        conditions.append('(c.created_at, c.id) < (%(cursor_created_at)s, %(cursor_id)s)')
+
+    columns = ', '.join(f'{CODE_FIELDS[field]} AS {field}' for field in fields)
+    sql = f'SELECT {columns}, c.created_at AS cursor_created_at, c.id AS cursor_id FROM {CODES_FROM_SQL}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY c.created_at DESC, c.id DESC'
+    if limit is not None:
+        params['limit'] = limit
+        sql += ' LIMIT %(limit)s'
+    return sql, params
+
 def get_invitation_code(code: str) -> Optional[Dict]:
     """Get invitation code by code string"""
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute('''
-                    SELECT * FROM invitation_codes 
-                    WHERE code = %s
-                ''', [code])
+                cur.execute(SELECT_CODES_SQL + ' WHERE c.code = %s', [code])
                 result = cur.fetchone()
                 if result:
-                    result['is_valid'] = (
-                        datetime.utcnow() < result['expires_at'] and
-                        result['call_count'] < result['max_calls']
-                    )
+                    result['is_valid'] = compute_is_valid(result)
                 return result
     except Exception as e:
         print(f"Error getting invitation code: {e}")
@@ -100,13 +605,10 @@ def get_all_invitation_codes() -> List[Dict]:
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute('SELECT * FROM invitation_codes ORDER BY created_at DESC')
+                cur.execute(SELECT_CODES_SQL + ' ORDER BY c.created_at DESC')
                 results = cur.fetchall()
                 for result in results:
-                    result['is_valid'] = (
-                        datetime.utcnow() < result['expires_at'] and
-                        result['call_count'] < result['max_calls']
-                    )
+                    result['is_valid'] = compute_is_valid(result)
                 return results
     except Exception as e:
         print(f"Error getting all invitation codes: {e}")
@@ -117,13 +619,125 @@ def increment_call_count(code: str) -> bool:
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute('''
-                    UPDATE invitation_codes 
-                    SET call_count = call_count + 1 
-                    WHERE code = %s
-                    RETURNING id
-                ''', [code])
+                cur.execute(INCREMENT_CODE_SQL, [code])
                 return bool(cur.fetchone())
     except Exception as e:
         print(f"Error incrementing call count: {e}")
         return False
+
+# Outcomes of consume_invitation_code
+CONSUME_OK = "ok"
+CONSUME_NOT_FOUND = "not_found"
+CONSUME_EXPIRED = "expired"
+CONSUME_EXHAUSTED = "exhausted"
+
+# Checks expiry and quota and increments in one statement, so concurrent
+# callers can never push call_count past max_calls. `pending` counts calls
+# buffered in memory by the write-behind usage buffer but not yet written.
+# RELEASE_CODE_SQL gives back a call taken this way when the session could
+# not start. APPLY_CALL_COUNTS_SQL applies many buffered increments in one
+# statement; codes are sorted by the caller so concurrent flushes lock rows
+# in the same order.
+if USAGE_TABLE:
+    INCREMENT_CODE_SQL = '''
+        UPDATE invitation_code_usage u
+        SET call_count = u.call_count + 1
+        FROM invitation_codes c
+        WHERE c.id = u.code_id AND c.code = %s
+        RETURNING c.id
+    '''
+
+    CONSUME_CODE_SQL = '''
+        UPDATE invitation_code_usage u
+        SET call_count = u.call_count + 1
+        FROM invitation_codes c
+        WHERE c.id = u.code_id
+          AND c.code = %(code)s
+          AND c.expires_at > %(now)s
+          AND u.call_count + %(pending)s < c.max_calls
+        RETURNING c.*, u.call_count
+    '''
+
+    REJECTION_CHECK_SQL = '''
+        SELECT c.expires_at, u.call_count, c.max_calls FROM invitation_codes c
+        JOIN invitation_code_usage u ON u.code_id = c.id
+        WHERE c.code = %(code)s
+    '''
+
+    RELEASE_CODE_SQL = '''
+        UPDATE invitation_code_usage u
+        SET call_count = u.call_count - 1
+        FROM invitation_codes c
+        WHERE c.id = u.code_id AND c.code = %(code)s AND u.call_count > 0
+        RETURNING c.*, u.call_count
+    '''
+
+    APPLY_CALL_COUNTS_SQL = '''
+        UPDATE invitation_code_usage u
+        SET call_count = u.call_count + v.delta
+        FROM invitation_codes c, unnest(%(codes)s::text[], %(deltas)s::int[]) AS v(code, delta)
+        WHERE c.id = u.code_id AND c.code = v.code
+        RETURNING c.code
+    '''
+else:
+    INCREMENT_CODE_SQL = '''
+        UPDATE invitation_codes
+        SET call_count = call_count + 1
+        WHERE code = %s
+        RETURNING id
+    '''
+
+    CONSUME_CODE_SQL = '''
+        UPDATE invitation_codes
+        SET call_count = call_count + 1
+        WHERE code = %(code)s
+          AND expires_at > %(now)s
+          AND call_count + %(pending)s < max_calls
+        RETURNING *
+    '''
+
+    REJECTION_CHECK_SQL = '''
+        SELECT expires_at, call_count, max_calls FROM invitation_codes
+        WHERE code = %(code)s
+    '''
+
+    RELEASE_CODE_SQL = '''
+        UPDATE invitation_codes
+        SET call_count = call_count - 1
+        WHERE code = %(code)s AND call_count > 0
+        RETURNING *
+    '''
+
+    APPLY_CALL_COUNTS_SQL = '''
+        UPDATE invitation_codes AS c
+        SET call_count = c.call_count + v.delta
+        FROM unnest(%(codes)s::text[], %(deltas)s::int[]) AS v(code, delta)
+        WHERE c.code = v.code
+        RETURNING c.code
+    '''
+
+def get_rejection_reason(code: Optional[Dict], now: datetime) -> str:
+    """Explain why a code could not be consumed, given its current record"""
+    if code is None:
+        return CONSUME_NOT_FOUND
+    if now >= code['expires_at']:
+        return CONSUME_EXPIRED
+    return CONSUME_EXHAUSTED
+
+def consume_invitation_code(code: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Atomically use one call of an invitation code.
+    Returns (CONSUME_OK, updated record) or (rejection reason, None).
+    """
+    params = {"code": code, "now": datetime.utcnow(), "pending": 0}
+    with get_db_connection(quiet=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(CONSUME_CODE_SQL, params)
+            result = cur.fetchone()
+            if result:
+                result['is_valid'] = compute_is_valid(result)
+                return CONSUME_OK, result
+
+            # Only the rejection path pays for a second query
+            cur.execute(REJECTION_CHECK_SQL, params)
+            return get_rejection_reason(cur.fetchone(), params["now"]), None
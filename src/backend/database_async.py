@@ -0,0 +1,266 @@
+"""
+Async data-access layer used by the FastAPI request handlers.
+Mirrors the queries in database.py on top of psycopg's async connections so
+that database round-trips never block the event loop. The CLI scripts use
+the direct connections of database.get_db_connection.
+"""
+from psycopg import errors
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Dict, List, Tuple
+from database import (
+    get_db_config, get_pool_config, compute_is_valid, get_rejection_reason,
+    CONSUME_OK, CONSUME_CODE_SQL, REJECTION_CHECK_SQL, RELEASE_CODE_SQL,
+    APPLY_CALL_COUNTS_SQL, INCREMENT_CODE_SQL, SELECT_CODES_SQL, build_codes_query, encode_cursor,
+    CHANGE_VERSION_SQL, CHANGE_WATERMARK_SQL, CODE_CHANGES_SQL, CODE_DELETIONS_SQL, CODE_NOTIFY_INSTALLED_SQL,
+    ADMIN_NOTIFY_INSTALLED_SQL,
+    COUNT_LOG_HORIZON_SQL, PRUNE_COUNT_LOG_SQL, ChangeHistoryExpiredError, decode_change_cursor, encode_change_cursor
+)
+
+_pool: Optional[AsyncConnectionPool] = None
+
+async def open_db_pool() -> AsyncConnectionPool:
+    """Open the shared async connection pool"""
+    global _pool
+    if _pool is None:
+        config = get_pool_config()
+        print(f"Opening async database pool (min={config['min_size']}, max={config['max_size']})")
+        _pool = AsyncConnectionPool(
+            get_db_config(),
+            kwargs={"row_factory": dict_row},
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+            name="voiceai-async",
+            **config
+        )
+        await _pool.open(wait=True, timeout=config["timeout"])
+    return _pool
+
+async def close_db_pool() -> None:
+    """Close the shared async connection pool"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def get_pool_stats() -> Dict:
+    """Get connection pool statistics, empty if the pool is not open"""
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
+@asynccontextmanager
+async def get_db_connection():
+    """Get an async database connection from the pool"""
+    if _pool is None:
+        raise RuntimeError("Async database pool is not open")
+    async with _pool.connection() as conn:
+        yield conn
+
+async def code_notify_installed() -> bool:
+    """Whether the invitation_codes_notify trigger from migrate_add_code_notify.py exists"""
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(CODE_NOTIFY_INSTALLED_SQL)
+            return (await cur.fetchone())['installed']
+
+async def admin_notify_installed() -> bool:
+    """Whether the admins_notify trigger from migrate_add_admin_notify.py exists"""
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(ADMIN_NOTIFY_INSTALLED_SQL)
+            return (await cur.fetchone())['installed']
+
+async def get_invitation_code(code: str) -> Optional[Dict]:
+    """Get invitation code by code string"""
+    try:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(SELECT_CODES_SQL + ' WHERE c.code = %s', [code])
+                result = await cur.fetchone()
+                if result:
+                    result['is_valid'] = compute_is_valid(result)
+                return result
+    except Exception as e:
+        print(f"Error getting invitation code: {e}")
+        return None
+
+async def list_invitation_codes(limit: int, cursor: Optional[str] = None, **filters) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of invitation codes, newest first, with is_valid computed in SQL.
+    Takes the fields and filters of build_codes_query and returns the rows
+    and the cursor of the next page, if there is one.
+    """
+    sql, params = build_codes_query(cursor=cursor, limit=limit + 1, **filters)
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            rows = await cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['cursor_created_at'], rows[-1]['cursor_id'])
+    for row in rows:
+        del row['cursor_created_at'], row['cursor_id']
+    return rows, next_cursor
+
+async def get_change_version() -> Optional[Dict]:
+    """
+    The current change version (the watermark to sync from), a fingerprint
+    of recent changes and the latest expiry that has passed, or None if
+    migrate_add_change_tracking.py has not been run
+    """
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            try:
+                await cur.execute(CHANGE_VERSION_SQL, {"now": datetime.utcnow()})
+            except (errors.UndefinedColumn, errors.UndefinedTable, errors.UndefinedFunction):
+                await conn.rollback()
+                return None
+            return await cur.fetchone()
+
+async def list_code_changes(cursor: str, limit: int) -> Optional[Dict]:
+    """
+    Codes created or changed since a version from list_invitation_codes or
+    a cursor from an earlier call, oldest change first, and codes deleted
+    meanwhile. Call again with `cursor` while `has_more` is true; once it is
+    false, `cursor` is the version to sync from next time. A code can be
+    repeated across syncs, never missed. Raises ValueError for a bad cursor
+    and ChangeHistoryExpiredError once the counter log no longer reaches back
+    to it; returns None if migrate_add_change_tracking.py has not been run.
+    """
+    since, watermark, after_xid, after_id = decode_change_cursor(cursor)
+    params = {"since": since, "after_xid": after_xid, "after_id": after_id,
+              "limit": limit + 1, "now": datetime.utcnow()}
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            # One snapshot for the rows, the deletions and the watermark
+            await cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            try:
+                await cur.execute(COUNT_LOG_HORIZON_SQL)
+                if since < (await cur.fetchone())["pruned_below"]:
+                    await conn.rollback()
+                    raise ChangeHistoryExpiredError(f"Changes since {since} are no longer kept")
+                if watermark is None:
+                    await cur.execute(CHANGE_WATERMARK_SQL)
+                    watermark = max((await cur.fetchone())["xid"], since)
+                await cur.execute(CODE_CHANGES_SQL, params)
+            except (errors.UndefinedColumn, errors.UndefinedTable, errors.UndefinedFunction):
+                await conn.rollback()
+                return None
+            rows = await cur.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            deleted = []
+            if not has_more:
+                await cur.execute(CODE_DELETIONS_SQL, params)
+                deleted = [row["code"] for row in await cur.fetchall()]
+
+    if has_more:
+        next_cursor = encode_change_cursor(since, watermark, rows[-1]["change_xid"], rows[-1]["id"])
+    else:
+        next_cursor = str(watermark)
+    for row in rows:
+        del row["change_xid"]
+    return {"changes": rows, "deleted": deleted, "cursor": next_cursor, "has_more": has_more}
+
+async def prune_count_log(retention: timedelta) -> int:
+    """
+    Drop counter log entries that are due, returning how many were dropped;
+    nothing to do before migrate_add_change_tracking.py has been run
+    """
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            try:
+                await cur.execute(PRUNE_COUNT_LOG_SQL, {"retention": retention})
+            except errors.UndefinedTable:
+                await conn.rollback()
+                return 0
+            return cur.rowcount
+
+async def iter_invitation_codes(batch_size: int = 1000, **filters) -> AsyncIterator[Dict]:
+    """
+    Every invitation code matching the filters of build_codes_query, newest
+    first, fetched one keyset page at a time so memory use does not grow
+    with the number of codes. The pooled connection is returned between
+    pages, so slow downloads do not hold connections the request handlers
+    need. Codes created during the export are not included.
+    """
+    cursor = None
+    while True:
+        rows, cursor = await list_invitation_codes(batch_size, cursor, **filters)
+        for row in rows:
+            yield row
+        if cursor is None:
+            return
+
+async def stream_codes() -> AsyncIterator[str]:
+    """Yield every invitation code string, fetched in batches through a server-side cursor"""
+    async with get_db_connection() as conn:
+        async with conn.cursor(name="stream_codes") as cur:
+            cur.itersize = 5000
+            await cur.execute('SELECT code FROM invitation_codes')
+            async for row in cur:
+                yield row['code']
+
+async def increment_call_count(code: str) -> bool:
+    """Increment the call count for an invitation code"""
+    try:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(INCREMENT_CODE_SQL, [code])
+                return bool(await cur.fetchone())
+    except Exception as e:
+        print(f"Error incrementing call count: {e}")
+        return False
+
+async def apply_call_count_deltas(deltas: Dict[str, int]) -> List[str]:
+    """Add buffered increments to their codes in one statement, returning the codes updated"""
+    codes = sorted(deltas)
+    params = {"codes": codes, "deltas": [deltas[code] for code in codes]}
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(APPLY_CALL_COUNTS_SQL, params)
+            return [row['code'] for row in await cur.fetchall()]
+
+async def consume_invitation_code(code: str, pending: int = 0) -> Tuple[str, Optional[Dict]]:
+    """
+    Atomically use one call of an invitation code, counting `pending`
+    unflushed calls against its quota.
+    Returns (CONSUME_OK, updated record) or (rejection reason, None).
+    """
+    params = {"code": code, "now": datetime.utcnow(), "pending": pending}
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(CONSUME_CODE_SQL, params)
+            result = await cur.fetchone()
+            if result:
+                result['is_valid'] = compute_is_valid(result)
+                return CONSUME_OK, result
+
+            await cur.execute(REJECTION_CHECK_SQL, params)
+            return get_rejection_reason(await cur.fetchone(), params["now"]), None
+
+async def release_invitation_code(code: str) -> bool:
+    """Give back a call taken by consume_invitation_code"""
+    try:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(RELEASE_CODE_SQL, {"code": code})
+                return bool(await cur.fetchone())
+    except Exception as e:
+        print(f"Error releasing invitation code: {e}")
+        return False
+
+async def get_admin(username: str) -> Optional[Dict]:
+    """Get an admin's credentials by username"""
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT username, hashed_password FROM admins WHERE username = %s",
+                (username,)
+            )
+            return await cur.fetchone()
@@ -0,0 +1,136 @@
+"""
+Shared HTTP client for the ElevenLabs API.
+One keep-alive client lives for the whole app so that conversation starts
+reuse pooled connections instead of paying for DNS and TLS every time.
+Signed URL requests go through an UpstreamGuard (circuit breaker, retry
+budget and optional hedging) that admits every attempt, hedges included,
+through a bounded queue so bursts and upstream incidents fail fast.
+"""
+import httpx
+import math
+import os
+from typing import Optional
+from fastapi import HTTPException
+from resilience import UpstreamGuard, CircuitBreaker, RetryBudget, CircuitOpenError
+from admission import AdmissionController, OverloadedError
+
+ELEVENLABS_API_URL = "https://api.elevenlabs.io"
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client_config() -> dict:
+    """Get timeouts and connection limits from environment variables"""
+    return {
+        "timeout": httpx.Timeout(
+            connect=float(os.getenv("ELEVENLABS_CONNECT_TIMEOUT", "5")),
+            read=float(os.getenv("ELEVENLABS_READ_TIMEOUT", "10")),
+            write=float(os.getenv("ELEVENLABS_WRITE_TIMEOUT", "5")),
+            pool=float(os.getenv("ELEVENLABS_POOL_TIMEOUT", "5")),
+        ),
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("ELEVENLABS_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("ELEVENLABS_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("ELEVENLABS_KEEPALIVE_EXPIRY", "60")),
+        ),
+    }
+
+def open_client() -> httpx.AsyncClient:
+    """Create the shared ElevenLabs client"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(base_url=ELEVENLABS_API_URL, **get_client_config())
+    return _client
+
+async def close_client() -> None:
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared client, creating it if the app has not opened it yet"""
+    return _client if _client is not None else open_client()
+
+def is_retryable(error: BaseException) -> bool:
+    """Transport errors, 429s and 5xx responses are worth retrying"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+def create_guard_from_env(admission: AdmissionController) -> UpstreamGuard:
+    """Create the circuit breaker, retry and hedging policy for ElevenLabs"""
+    return UpstreamGuard(
+        is_retryable,
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("ELEVENLABS_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("ELEVENLABS_BREAKER_RESET", "30")),
+        ),
+        budget=RetryBudget(ratio=float(os.getenv("ELEVENLABS_RETRY_BUDGET_RATIO", "0.2"))),
+        max_attempts=int(os.getenv("ELEVENLABS_RETRY_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("ELEVENLABS_RETRY_BASE_DELAY", "0.2")),
+        hedge_percentile=float(os.getenv("ELEVENLABS_HEDGE_PERCENTILE", "0")),
+        admission=admission,
+    )
+
+# Bounds concurrent requests against our ElevenLabs API quota
+upstream_admission = AdmissionController(
+    max_concurrent=int(os.getenv("ELEVENLABS_MAX_CONCURRENT", "10")),
+    max_queue=int(os.getenv("ELEVENLABS_MAX_QUEUE", "50")),
+    queue_timeout=float(os.getenv("ELEVENLABS_QUEUE_TIMEOUT", "5")),
+)
+
+upstream_guard = create_guard_from_env(upstream_admission)
+
+async def _request_signed_url(agent_id: str, xi_api_key: str) -> str:
+    """Single signed URL request; raises httpx errors"""
+    path = "/v1/convai/conversation/get_signed_url"
+    print(f"\n=== REQUEST ===\nURL: {ELEVENLABS_API_URL}{path}?agent_id={agent_id}\nHeaders: {{'xi-api-key': '*****'}}\n")
+    
+    response = await get_client().get(
+        path,
+        params={"agent_id": agent_id},
+        headers={
+            "xi-api-key": xi_api_key
+        }
+    )
+    
+    print(f"\n=== RESPONSE ===\nStatus: {response.status_code}\nHeaders: {dict(response.headers)}\nBody: {response.text}\n")
+    
+    response.raise_for_status()
+    data = response.json()
+    return data["signed_url"]
+
+async def fetch_signed_url() -> str:
+    """Request a conversation signed URL from ElevenLabs through admission control and the upstream guard"""
+    agent_id = os.getenv("AGENT_ID")
+    xi_api_key = os.getenv("XI_API_KEY")
+    
+    if not agent_id or not xi_api_key:
+        raise HTTPException(status_code=500, detail="Missing AGENT_ID or XI_API_KEY environment variables")
+    
+    try:
+        return await upstream_guard.call(lambda: _request_signed_url(agent_id, xi_api_key))
+    except OverloadedError as e:
+        print(f"Rejecting signed URL request: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Too many conversations are starting right now. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except CircuitOpenError as e:
+        print(f"ElevenLabs circuit open, failing fast: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Voice service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except httpx.TimeoutException as e:
+        print(f"Timeout from ElevenLabs API: {str(e)}")
+        raise HTTPException(status_code=504, detail="Timed out getting signed URL")
+    except httpx.HTTPError as e:
+        print(f"Error from ElevenLabs API: {str(e)}")
+        if hasattr(e, 'response') and e.response is not None:
+            print(f"Response content: {e.response.content}")
+        raise HTTPException(status_code=502, detail=f"Failed to get signed URL: {str(e)}")
@@ -0,0 +1,103 @@
+"""
+In-process event bus for live admin updates over Server-Sent Events.
+Invitation code changes arrive once per server from the code cache's
+LISTEN/NOTIFY listener, are coalesced per code over a short interval, and
+each batch is serialized once and handed to every connected admin. The
+database sees the same load whether one admin is watching or a hundred.
+"""
+import asyncio
+import os
+from contextlib import contextmanager
+from typing import Dict, Optional, Set
+import orjson
+from database import compute_is_valid
+
+# Sent to a subscriber that fell behind; it should reload instead of patching
+RESYNC_MESSAGE = "event: resync\ndata: {}\n\n"
+
+class EventBus:
+    def __init__(self, flush_interval: float = 0.25, queue_size: int = 100):
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size  # batches buffered per subscriber before it is resynced
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.pending: Dict[str, Dict] = {}  # code -> latest change, coalesced until the next flush
+        self.published = 0
+        self.batches = 0
+        self.resyncs = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self, key: str, event: Dict) -> None:
+        if not self.subscribers:
+            return
+        self.published += 1
+        self.pending[key] = event
+
+    def on_code_change(self, op: str, row: Optional[Dict]) -> None:
+        """code_cache subscriber: queue a change, or a resync after missed notifications"""
+        if op == "RESYNC":
+            self.broadcast(RESYNC_MESSAGE)
+            return
+        row = dict(row)
+        row['is_valid'] = compute_is_valid(row)
+        self.publish(row['code'], {"op": op, "code": row})
+
+    def broadcast(self, message: str) -> None:
+        """Hand one serialized message to every subscriber"""
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A slow client gets a resync instead of unbounded memory
+                self.resyncs += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_MESSAGE)
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        batch = list(self.pending.values())
+        self.pending = {}
+        self.batches += 1
+        self.broadcast(f"event: codes\ndata: {orjson.dumps(batch).decode()}\n\n")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    @contextmanager
+    def subscribe(self):
+        """Register a subscriber queue of serialized SSE messages for the duration of the block"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers.discard(queue)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "batches": self.batches,
+            "resyncs": self.resyncs,
+        }
+
+event_bus = EventBus(
+    flush_interval=float(os.getenv("EVENTS_FLUSH_INTERVAL", "0.25")),
+    queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "100")),
+)
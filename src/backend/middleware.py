@@ -0,0 +1,97 @@
+"""
+Pure-ASGI middleware for the request path.
+Unlike BaseHTTPMiddleware these add no per-request task or body-stream
+wrapping, and rejections are answered directly without running the app.
+"""
+import json
+import math
+import time
+from typing import Callable, Iterable, Optional
+from rate_limit import SlidingWindowLimiter
+
+async def send_json(send, status_code: int, body: dict, headers: Iterable = ()) -> None:
+    """Send a complete JSON response straight from middleware"""
+    content = json.dumps(body).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(content)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": content})
+
+def bearer_token(scope) -> Optional[str]:
+    """The bearer token in a request's Authorization header, if any"""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token.strip():
+                return None
+            return token.strip()
+    return None
+
+class RateLimitMiddleware:
+    """
+    Per-client-IP rate limit, skipping the exempt path prefixes. Requests
+    that admin_key attributes to an authenticated admin are counted per
+    admin against admin_limiter instead, so dashboard use does not spend
+    the anonymous budget.
+    """
+    def __init__(
+        self,
+        app,
+        limiter: SlidingWindowLimiter,
+        exempt_prefixes: Iterable[str] = ("/static", "/admin"),
+        admin_limiter: Optional[SlidingWindowLimiter] = None,
+        admin_key: Optional[Callable[[dict], Optional[str]]] = None,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.admin_limiter = admin_limiter
+        self.admin_key = admin_key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_prefixes):
+            return await self.app(scope, receive, send)
+
+        admin = self.admin_key(scope) if self.admin_key and self.admin_limiter else None
+        if admin is not None:
+            wait_seconds = self.admin_limiter.hit(admin)
+        else:
+            client = scope.get("client")
+            wait_seconds = self.limiter.hit(client[0] if client else "unknown")
+        if wait_seconds:
+            return await send_json(
+                send,
+                429,
+                {"detail": "Too many requests. Please try again later."},
+                [(b"retry-after", str(math.ceil(wait_seconds)).encode())]
+            )
+
+        await self.app(scope, receive, send)
+
+class TimingMiddleware:
+    """Adds a Server-Timing header with the time spent handling the request"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                duration = (time.perf_counter() - started) * 1000
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", f"app;dur={duration:.1f}".encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the change-notification trigger to the admins table.
+The server's admin principal cache listens for these notifications to drop
+created, changed or deleted admins at once instead of after ADMIN_CACHE_TTL.
+"""
+
+from database import get_db_connection, ADMIN_NOTIFY_TRIGGER_SQL, ADMIN_NOTIFY_INSTALLED_SQL
+import sys
+
+def migrate_add_admin_notify():
+    """Create or replace the notify trigger on admins"""
+    print("Starting migration to add admin change notifications...")
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(ADMIN_NOTIFY_INSTALLED_SQL)
+                if cur.fetchone()['installed']:
+                    print("Trigger already exists, replacing it with the current definition...")
+                
+                cur.execute(ADMIN_NOTIFY_TRIGGER_SQL)
+                conn.commit()
+                print("Migration completed successfully!")
+                return True
+                
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return False
+
+def verify_migration():
+    """Verify that the trigger is installed"""
+    print("Verifying migration...")
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(ADMIN_NOTIFY_INSTALLED_SQL)
+                if cur.fetchone()['installed']:
+                    print("✓ Migration verification successful: admins_notify trigger installed")
+                    return True
+                else:
+                    print("✗ Migration verification failed: trigger not found")
+                    return False
+                    
+    except Exception as e:
+        print(f"Migration verification failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("Admins Change Notification Migration")
+    print("=" * 40)
+    
+    # Run migration
+    if migrate_add_admin_notify():
+        # Verify migration
+        if verify_migration():
+            print("\n✓ Migration completed and verified successfully!")
+            sys.exit(0)
+        else:
+            print("\n✗ Migration verification failed!")
+            sys.exit(1)
+    else:
+        print("\n✗ Migration failed!")
+        sys.exit(1)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration script to add change tracking to the invitation_codes table.
+Adds the change_xid column with its index and trigger, and the
+invitation_code_count_log and invitation_code_deletions tables used by
+/api/codes/changes. Also replaces the change_seq sequence and
+invitation_code_count_changes table of earlier versions. Requires
+PostgreSQL 13 or later.
+"""
+
+from database import get_db_connection, CHANGE_TRACKING_SQL
+import sys
+
+def migrate_add_change_tracking():
+    """Install or update the change tracking columns, tables and triggers"""
+    print("Starting migration to add invitation code change tracking...")
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(CHANGE_TRACKING_SQL)
+                conn.commit()
+                print("Migration completed successfully!")
+                return True
+                
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return False
+
+def verify_migration():
+    """Verify that the change tracking triggers exist"""
+    print("Verifying migration...")
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT count(*) AS triggers FROM pg_trigger
+                    WHERE tgname IN ('invitation_codes_change_xid', 'invitation_codes_deletion',
+                                     'invitation_codes_count_change', 'invitation_code_usage_count_change')
+                """)
+                result = cur.fetchone()
+                if result['triggers'] == 3:
+                    print("✓ Migration verification successful: change tracking installed")
+                    return True
+                else:
+                    print(f"✗ Migration verification failed: {result['triggers']} of 3 triggers")
+                    return False
+                    
+    except Exception as e:
+        print(f"Migration verification failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("Invitation Codes Change Tracking Migration")
+    print("=" * 40)
+    
+    # Run migration
+    if migrate_add_change_tracking():
+        # Verify migration
+        if verify_migration():
+            print("\n✓ Migration completed and verified successfully!")
+            sys.exit(0)
+        else:
+            print("\n✗ Migration verification failed!")
+            sys.exit(1)
+    else:
+        print("\n✗ Migration failed!")
+        sys.exit(1)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the indexes used by the paginated code listing.
+Indexes are built concurrently, so the server can keep running. Also makes
+invitation_codes.created_at NOT NULL, which keyset pagination relies on.
+"""
+
+from database import get_db_connection, CODE_INDEXES_SQL
+import sys
+
+INDEX_NAMES = [sql.split(' IF NOT EXISTS ')[1].split()[0] for sql in CODE_INDEXES_SQL]
+
+def migrate_add_code_indexes():
+    """Backfill created_at and create the listing indexes"""
+    print("Starting migration to add invitation code listing indexes...")
+    
+    try:
+        with get_db_connection() as conn:
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("UPDATE invitation_codes SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+                if cur.rowcount:
+                    print(f"Set created_at on {cur.rowcount} codes that had none")
+                cur.execute("ALTER TABLE invitation_codes ALTER COLUMN created_at SET NOT NULL")
+
+                for name, sql in zip(INDEX_NAMES, CODE_INDEXES_SQL):
+                    print(f"Creating {name}...")
+                    cur.execute(sql)
+                print("Migration completed successfully!")
+                return True
+                
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return False
+
+def verify_migration():
+    """Verify that every index exists and is valid"""
+    print("Verifying migration...")
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                # A failed concurrent build leaves an invalid index behind
+                cur.execute("""
+                    SELECT c.relname FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = ANY(%s) AND i.indisvalid
+                """, [INDEX_NAMES])
+                found = {row['relname'] for row in cur.fetchall()}
+                missing = [name for name in INDEX_NAMES if name not in found]
+                if not missing:
+                    print("✓ Migration verification successful: all listing indexes are valid")
+                    return True
+                else:
+                    print(f"✗ Migration verification failed: missing or invalid {', '.join(missing)}")
+                    print("Drop invalid indexes and run the migration again")
+                    return False
+                    
+    except Exception as e:
+        print(f"Migration verification failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("Invitation Code Listing Index Migration")
+    print("=" * 40)
+    
+    # Run migration
+    if migrate_add_code_indexes():
+        # Verify migration
+        if verify_migration():
+            print("\n✓ Migration completed and verified successfully!")
+            sys.exit(0)
+        else:
+            print("\n✗ Migration verification failed!")
+            sys.exit(1)
+    else:
+        print("\n✗ Migration failed!")
+        sys.exit(1)
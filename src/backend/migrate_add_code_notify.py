@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the change-notification trigger to the invitation_codes table.
+The server's invitation code cache listens for these notifications to stay
+up to date without re-reading codes from the database.
+"""
+
+from database import get_db_connection, CODE_NOTIFY_TRIGGER_SQL, USAGE_TABLE_SQL, USAGE_TABLE
+import sys
+
+TRIGGER_EXISTS_SQL = """
+    SELECT EXISTS (
+        SELECT FROM pg_trigger
+        WHERE tgname = 'invitation_codes_notify'
+        AND tgrelid = 'invitation_codes'::regclass
+    )
+"""
+
+def migrate_add_code_notify():
+    """Create or replace the notify trigger on invitation_codes"""
+    print("Starting migration to add invitation code change notifications...")
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(TRIGGER_EXISTS_SQL)
+                if cur.fetchone()['exists']:
+                    print("Trigger already exists, replacing it with the current definition...")
+                
+                cur.execute(CODE_NOTIFY_TRIGGER_SQL)
+                if USAGE_TABLE:
+                    # Keep the merged-row payload used with invitation_code_usage
+                    cur.execute(USAGE_TABLE_SQL)
+                conn.commit()
+                print("Migration completed successfully!")
+                return True
+                
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return False
+
+def verify_migration():
+    """Verify that the trigger is installed"""
+    print("Verifying migration...")
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(TRIGGER_EXISTS_SQL)
+                if cur.fetchone()['exists']:
+                    print("✓ Migration verification successful: invitation_codes_notify trigger installed")
+                    return True
+                else:
+                    print("✗ Migration verification failed: trigger not found")
+                    return False
+                    
+    except Exception as e:
+        print(f"Migration verification failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("Invitation Codes Change Notification Migration")
+    print("=" * 40)
+    
+    # Run migration
+    if migrate_add_code_notify():
+        # Verify migration
+        if verify_migration():
+            print("\n✓ Migration completed and verified successfully!")
+            sys.exit(0)
+        else:
+            print("\n✗ Migration verification failed!")
+            sys.exit(1)
+    else:
+        print("\n✗ Migration failed!")
+        sys.exit(1)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Migration script to move call_count from invitation_codes into the narrow
+invitation_code_usage table. Run with --revert to move it back.
+Set CODE_USAGE_TABLE=1 for the server once migrated (and unset it after
+reverting); servers still running with the other setting will fail their
+queries until restarted.
+"""
+
+from database import get_db_connection, CODE_NOTIFY_TRIGGER_SQL, USAGE_TABLE_SQL, CHANGE_TRACKING_SQL
+import sys
+
+USAGE_TABLE_EXISTS_SQL = """
+    SELECT EXISTS (
+        SELECT FROM information_schema.tables
+        WHERE table_name = 'invitation_code_usage'
+    )
+"""
+
+def change_tracking_installed(cur) -> bool:
+    cur.execute("SELECT to_regclass('invitation_code_count_log') IS NOT NULL AS tracked")
+    return cur.fetchone()['tracked']
+
+def migrate_split_usage():
+    """Create invitation_code_usage, copy the counters and drop invitation_codes.call_count"""
+    print("Starting migration to move call counts into invitation_code_usage...")
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(USAGE_TABLE_EXISTS_SQL)
+                if cur.fetchone()['exists']:
+                    print("invitation_code_usage already exists, nothing to do")
+                    return True
+
+                # Block increments so none are lost between the copy and the drop
+                cur.execute("LOCK TABLE invitation_codes IN EXCLUSIVE MODE")
+                cur.execute(USAGE_TABLE_SQL)
+                cur.execute("""
+                    INSERT INTO invitation_code_usage (code_id, call_count)
+                    SELECT id, COALESCE(call_count, 0) FROM invitation_codes
+                """)
+                print(f"Copied {cur.rowcount} call counts")
+                # The counter change trigger depends on the column
+                cur.execute("DROP TRIGGER IF EXISTS invitation_codes_count_change ON invitation_codes")
+                cur.execute("ALTER TABLE invitation_codes DROP COLUMN call_count")
+                if change_tracking_installed(cur):
+                    # Move the counter change trigger to the new table
+                    cur.execute(CHANGE_TRACKING_SQL)
+                conn.commit()
+                print("Migration completed successfully!")
+                return True
+
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return False
+
+def revert_split_usage():
+    """Move call counts back into invitation_codes and drop invitation_code_usage"""
+    print("Reverting call counts into invitation_codes...")
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(USAGE_TABLE_EXISTS_SQL)
+                if not cur.fetchone()['exists']:
+                    print("invitation_code_usage does not exist, nothing to do")
+                    return True
+
+                cur.execute("LOCK TABLE invitation_codes, invitation_code_usage IN EXCLUSIVE MODE")
+                cur.execute("ALTER TABLE invitation_codes ADD COLUMN call_count INTEGER DEFAULT 0")
+                cur.execute("""
+                    UPDATE invitation_codes c SET call_count = u.call_count
+                    FROM invitation_code_usage u WHERE u.code_id = c.id
+                """)
+                cur.execute("DROP TRIGGER IF EXISTS invitation_codes_usage_row ON invitation_codes")
+                cur.execute("DROP TABLE invitation_code_usage")
+                cur.execute("DROP FUNCTION IF EXISTS create_invitation_code_usage()")
+                # Restore the single-table notification payload
+                cur.execute(CODE_NOTIFY_TRIGGER_SQL)
+                if change_tracking_installed(cur):
+                    cur.execute(CHANGE_TRACKING_SQL)
+                conn.commit()
+                print("Revert completed successfully!")
+                return True
+
+    except Exception as e:
+        print(f"Revert failed: {e}")
+        return False
+
+def verify_migration(expect_split: bool):
+    """Verify where call_count is stored"""
+    print("Verifying migration...")
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT table_name FROM information_schema.columns
+                    WHERE column_name = 'call_count'
+                    AND table_name IN ('invitation_codes', 'invitation_code_usage')
+                """)
+                tables = {row['table_name'] for row in cur.fetchall()}
+                expected = {'invitation_code_usage'} if expect_split else {'invitation_codes'}
+                if tables == expected:
+                    print(f"✓ Migration verification successful: call_count is stored in {expected.pop()}")
+                    return True
+                else:
+                    print(f"✗ Migration verification failed: call_count found in {sorted(tables)}")
+                    return False
+
+    except Exception as e:
+        print(f"Migration verification failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("Invitation Code Usage Table Migration")
+    print("=" * 40)
+
+    revert = "--revert" in sys.argv[1:]
+
+    # Run migration
+    if revert_split_usage() if revert else migrate_split_usage():
+        # Verify migration
+        if verify_migration(expect_split=not revert):
+            print("\n✓ Migration completed and verified successfully!")
+            print(f"Restart the server with CODE_USAGE_TABLE={'0' if revert else '1'}")
+            sys.exit(0)
+        else:
+            print("\n✗ Migration verification failed!")
+            sys.exit(1)
+    else:
+        print("\n✗ Migration failed!")
+        sys.exit(1)
@@ -0,0 +1,95 @@
+"""
+Password hashing off the event loop.
+bcrypt is deliberately slow (~100+ ms of CPU per hash), so request
+handlers run it on a small dedicated thread pool behind an admission
+queue instead of blocking every other request. Also provides a
+calibration mode that reports which bcrypt cost factor meets a target
+hash time on the current hardware:
+
+    python passwords.py --calibrate [--target-ms 250]
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from passlib.context import CryptContext
+from admission import AdmissionController
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+class PasswordWorkerPool:
+    """
+    Runs verify on a size-limited thread pool with a bounded queue. Hashing
+    only happens in the create_admin.py CLI, which has no event loop to block.
+    """
+    def __init__(self, workers: int = 2, max_queue: int = 32, queue_timeout: float = 10):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Admission keeps the executor's own queue empty so waits are measured and bounded
+        self.admission = AdmissionController(max_concurrent=workers, max_queue=max_queue, queue_timeout=queue_timeout)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        async with self.admission.slot():
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Raises admission.OverloadedError if the queue is full"""
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict:
+        return {"workers": self.workers, "rounds": BCRYPT_ROUNDS, **self.admission.get_stats()}
+
+password_pool = PasswordWorkerPool(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32")),
+    queue_timeout=float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "10")),
+)
+
+def calibrate(target_ms: float = 250, min_rounds: int = 10, max_rounds: int = 16) -> List[Dict]:
+    """Time one bcrypt hash per cost factor, stopping once target_ms is exceeded"""
+    results = []
+    for rounds in range(min_rounds, max_rounds + 1):
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        results.append({"rounds": rounds, "ms": elapsed_ms})
+        if elapsed_ms > target_ms:
+            break
+    return results
+
+def print_calibration(target_ms: float = 250) -> int:
+    """Print calibration results and return the recommended cost factor"""
+    results = calibrate(target_ms)
+    # Highest cost factor that stays within the target, or the cheapest measured
+    within = [r for r in results if r["ms"] <= target_ms] or results[:1]
+    recommended = within[-1]["rounds"]
+    print(f"bcrypt calibration (target {target_ms:.0f} ms per hash, current BCRYPT_ROUNDS={BCRYPT_ROUNDS}):")
+    for r in results:
+        marker = " <- recommended" if r["rounds"] == recommended else ""
+        print(f"  rounds={r['rounds']:>2}: {r['ms']:7.1f} ms{marker}")
+    return recommended
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="bcrypt cost factor calibration")
+    parser.add_argument("--calibrate", action="store_true", help="time bcrypt cost factors on this machine")
+    parser.add_argument("--target-ms", type=float, default=250, help="target time per hash in milliseconds")
+    args = parser.parse_args()
+    if args.calibrate:
+        print_calibration(args.target_ms)
+    else:
+        parser.print_help()
@@ -1,21 +1,422 @@
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import psycopg
 from fastapi import Request, HTTPException, status
 
+# (namespaced key, window index)
+WindowKey = Tuple[str, int]
+
+class _Window:
+    """Counters for the current and previous fixed windows of one key"""
+    __slots__ = ("index", "previous", "current")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.previous = 0
+        self.current = 0
+
+class MemoryStore:
+    """
+    In-process counter store. Keys are kept in LRU order and evicted once
+    idle for two windows (when both counters are necessarily zero) or when
+    `max_keys` is exceeded, so memory stays bounded however many clients
+    we see.
+    """
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self.evictions = 0
+
+    def _evict(self, index: int) -> None:
+        """Drop idle keys from the LRU end and enforce max_keys"""
+        windows = self.windows
+        while windows:
+            key, window = next(iter(windows.items()))
+            if window.index >= index - 1 and len(windows) <= self.max_keys:
+                break
+            del windows[key]
+            self.evictions += 1
+
+    def _window(self, key: str, index: int, create: bool) -> Optional[_Window]:
+        window = self.windows.get(key)
+        if window is None:
+            if not create:
+                return None
+            window = self.windows[key] = _Window(index)
+            self._evict(index)
+        else:
+            self.windows.move_to_end(key)
+            if index != window.index:
+                # Roll forward; anything older than the previous window has expired
+                window.previous = window.current if index == window.index + 1 else 0
+                window.current = 0
+                window.index = index
+        return window
+
+    def counts(self, key: str, index: int) -> Tuple[int, int]:
+        """(previous, current) window counts for key"""
+        window = self._window(key, index, create=False)
+        return (window.previous, window.current) if window else (0, 0)
+
+    def increment(self, key: str, index: int) -> None:
+        self._window(key, index, create=True).current += 1
+
+    def reset(self, key: str) -> None:
+        self.windows.pop(key, None)
+
+    def close(self) -> None:
+        pass
+
+    def get_stats(self) -> dict:
+        return {"backend": "memory", "keys": len(self.windows), "max_keys": self.max_keys, "evictions": self.evictions}
+
+class SQLiteBackend:
+    """
+    Counters in a local SQLite file in WAL mode, shared by all worker
+    processes on one host.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Created lazily so it belongs to the flush thread that uses it
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit_counters (
+                    key TEXT NOT NULL,
+                    window_index INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (key, window_index)
+                ) WITHOUT ROWID
+            """)
+        return self._conn
+
+    def apply(self, increments: Dict[WindowKey, int], resets: Set[str],
+              lookups: Set[WindowKey], expire: Optional[Tuple[str, int]]) -> Dict[WindowKey, int]:
+        """
+        Apply pending increments and resets in one transaction and return
+        current totals for every incremented or looked-up window. `expire`
+        is an optional (key prefix, window index) below which counters are
+        deleted.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM rate_limit_counters WHERE key = ?", [(key,) for key in resets])
+            conn.executemany("""
+                INSERT INTO rate_limit_counters (key, window_index, count) VALUES (?, ?, ?)
+                ON CONFLICT (key, window_index) DO UPDATE SET count = count + excluded.count
+            """, [(key, index, count) for (key, index), count in increments.items()])
+            if expire:
+                conn.execute(
+                    "DELETE FROM rate_limit_counters WHERE key LIKE ? AND window_index < ?",
+                    (f"{expire[0]}%", expire[1])
+                )
+            totals = {}
+            for key, index in lookups | increments.keys():
+                row = conn.execute(
+                    "SELECT count FROM rate_limit_counters WHERE key = ? AND window_index = ?",
+                    (key, index)
+                ).fetchone()
+                totals[(key, index)] = row[0] if row else 0
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return totals
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class PostgresBackend:
+    """
+    Counters in an UNLOGGED Postgres table shared by every instance, updated
+    with atomic upserts.
+    """
+    name = "postgres"
+
+    def __init__(self, conninfo: str):
+        self.conninfo = conninfo
+        self._conn: Optional[psycopg.Connection] = None
+
+    def _connection(self) -> psycopg.Connection:
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg.connect(self.conninfo, autocommit=True)
+            self._conn.execute("""
+                CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_counters (
+                    key TEXT NOT NULL,
+                    window_index BIGINT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (key, window_index)
+                )
+            """)
+        return self._conn
+
+    def apply(self, increments: Dict[WindowKey, int], resets: Set[str],
+              lookups: Set[WindowKey], expire: Optional[Tuple[str, int]]) -> Dict[WindowKey, int]:
+        conn = self._connection()
+        totals = {}
+        with conn.transaction():
+            if resets:
+                conn.execute("DELETE FROM rate_limit_counters WHERE key = ANY(%s)", [list(resets)])
+            if increments:
+                keys, indexes, counts = zip(*((key, index, count) for (key, index), count in increments.items()))
+                rows = conn.execute("""
+                    INSERT INTO rate_limit_counters (key, window_index, count)
+                    SELECT * FROM unnest(%s::text[], %s::bigint[], %s::int[])
+                    ON CONFLICT (key, window_index)
+                    DO UPDATE SET count = rate_limit_counters.count + excluded.count
+                    RETURNING key, window_index, count
+                """, [list(keys), list(indexes), list(counts)]).fetchall()
+                totals.update({(key, index): count for key, index, count in rows})
+            lookups = lookups - totals.keys()
+            if lookups:
+                keys, indexes = zip(*lookups)
+                rows = conn.execute("""
+                    SELECT c.key, c.window_index, c.count
+                    FROM unnest(%s::text[], %s::bigint[]) AS l(key, window_index)
+                    JOIN rate_limit_counters c USING (key, window_index)
+                """, [list(keys), list(indexes)]).fetchall()
+                totals.update({lookup: 0 for lookup in lookups})
+                totals.update({(key, index): count for key, index, count in rows})
+            if expire:
+                conn.execute(
+                    "DELETE FROM rate_limit_counters WHERE key LIKE %s AND window_index < %s",
+                    [f"{expire[0]}%", expire[1]]
+                )
+        return totals
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class BatchedStore:
+    """
+    Keeps a shared backend off the request path. Requests are pre-counted
+    locally and checked against the last known shared totals plus local
+    pending counts; a background thread flushes pending increments to the
+    backend every `flush_interval` seconds in one round-trip and pulls back
+    fresh totals for the keys seen since the last flush. The limit is
+    therefore enforced across workers with at most one interval of lag.
+    """
+    def __init__(self, backend, namespace: str, flush_interval: float = 0.25):
+        self.backend = backend
+        self.namespace = namespace
+        self.flush_interval = flush_interval
+        self.known: Dict[WindowKey, int] = {}
+        self.pending: Dict[WindowKey, int] = {}
+        self.touched: Set[WindowKey] = set()
+        self.resets: Set[str] = set()
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+        self._latest_index = 0
+        self._expired_index = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"rate-limit-{namespace}", daemon=True)
+        self._thread.start()
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def counts(self, key: str, index: int) -> Tuple[int, int]:
+        key = self._key(key)
+        previous, current = (key, index - 1), (key, index)
+        with self._lock:
+            self._latest_index = max(self._latest_index, index)
+            self.touched.add(previous)
+            self.touched.add(current)
+            return (
+                self.known.get(previous, 0) + self.pending.get(previous, 0),
+                self.known.get(current, 0) + self.pending.get(current, 0),
+            )
+
+    def increment(self, key: str, index: int) -> None:
+        window = (self._key(key), index)
+        with self._lock:
+            self.pending[window] = self.pending.get(window, 0) + 1
+
+    def reset(self, key: str) -> None:
+        key = self._key(key)
+        with self._lock:
+            for store in (self.known, self.pending):
+                for window in [w for w in store if w[0] == key]:
+                    del store[window]
+            self.resets.add(key)
+
+    def flush(self) -> None:
+        with self._lock:
+            increments, self.pending = self.pending, {}
+            lookups, self.touched = self.touched, set()
+            resets, self.resets = self.resets, set()
+            oldest_index = self._latest_index - 1
+        # Expire old counters once per window rather than on every flush
+        expire = None
+        if oldest_index > self._expired_index:
+            expire = (self._key(""), oldest_index)
+        if not (increments or lookups or resets or expire):
+            return
+
+        started = time.monotonic()
+        try:
+            totals = self.backend.apply(increments, resets, lookups, expire)
+        except Exception as e:
+            self.flush_errors += 1
+            print(f"Rate limit flush to {self.backend.name} failed: {e}")
+            # Keep the counts so they are sent with the next flush
+            with self._lock:
+                for window, count in increments.items():
+                    self.pending[window] = self.pending.get(window, 0) + count
+                self.resets |= resets
+            return
+
+        with self._lock:
+            # Shared totals already include what we just sent; anything
+            # counted meanwhile is still in pending
+            self.known.update(totals)
+            for window in [w for w in self.known if w[1] < oldest_index]:
+                del self.known[window]
+        if expire:
+            self._expired_index = oldest_index
+        self.flushes += 1
+        self.last_flush_seconds = time.monotonic() - started
+
+    def _run(self) -> None:
+        # The backend connection is only ever used from this thread
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+        self.backend.close()
+
+    def close(self) -> None:
+        """Flush remaining counts and stop the flush thread"""
+        self._stop.set()
+        self._thread.join()
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "keys": len(self.known),
+            "pending": len(self.pending),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+_stores = []
+
+def create_store_from_env(namespace: str):
+    """
+    Create the counter store selected by RATE_LIMIT_BACKEND: "memory"
+    (per process), "sqlite" (shared by workers on one host) or "postgres"
+    (shared by every instance).
+    """
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if backend == "memory":
+        store = MemoryStore(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
+    else:
+        if backend == "sqlite":
+            shared = SQLiteBackend(os.getenv("RATE_LIMIT_SQLITE_PATH", "rate_limits.sqlite3"))
+        elif backend == "postgres":
+            from database import get_db_config
+            shared = PostgresBackend(get_db_config())
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+        store = BatchedStore(
+            shared,
+            namespace,
+            flush_interval=float(os.getenv("RATE_LIMIT_FLUSH_INTERVAL", "0.25"))
+        )
+    _stores.append(store)
+    return store
+
+def close_stores() -> None:
+    """Flush and close every store created by create_store_from_env"""
+    while _stores:
+        _stores.pop().close()
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter rate limiter shared by the request middleware and
+    the login limiter. Each key keeps two counters, and the request count for
+    the last `window_seconds` is estimated by weighting the previous window by
+    how much of it still overlaps. Every operation is O(1). Counters live in
+    a pluggable store; by default an in-process MemoryStore.
+    """
+    def __init__(self, limit: int, window_seconds: float, max_keys: int = 100_000, store=None):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.store = store if store is not None else MemoryStore(max_keys)
+
+    def _estimate(self, previous: int, current: int, index: int, now: float) -> float:
+        elapsed = now / self.window_seconds - index
+        return previous * (1 - elapsed) + current
+
+    def _retry_after(self, previous: int, current: int, index: int, now: float) -> float:
+        """Seconds until one more request fits under the limit (always > 0)"""
+        elapsed = now - index * self.window_seconds
+        allowed = self.limit - 1
+        if current > allowed:
+            # Wait for the next window, then for enough of this one to slide out
+            wait = self.window_seconds - elapsed
+            wait += self.window_seconds * (1 - allowed / current)
+        else:
+            wait = self.window_seconds * (1 - (allowed - current) / previous) - elapsed
+        return max(wait, 0.001)
+
+    def check(self, key: str, now: Optional[float] = None) -> float:
+        """Return 0 if another request is allowed, else seconds to wait. Does not count."""
+        # Wall-clock time so window boundaries agree across processes and hosts
+        now = time.time() if now is None else now
+        index = int(now // self.window_seconds)
+        previous, current = self.store.counts(key, index)
+        if self._estimate(previous, current, index, now) + 1 <= self.limit:
+            return 0.0
+        return self._retry_after(previous, current, index, now)
+
+    def add(self, key: str, now: Optional[float] = None) -> None:
+        """Count a request for key without checking the limit"""
+        now = time.time() if now is None else now
+        self.store.increment(key, int(now // self.window_seconds))
+
+    def hit(self, key: str, now: Optional[float] = None) -> float:
+        """Check and count in one step; returns 0 if allowed, else seconds to wait"""
+        now = time.time() if now is None else now
+        wait = self.check(key, now)
+        if not wait:
+            self.add(key, now)
+        return wait
+
+    def reset(self, key: str) -> None:
+        self.store.reset(key)
+
+    def get_stats(self) -> dict:
+        return self.store.get_stats()
+
 class RateLimiter:
     def __init__(self, window_minutes: int = 15, max_attempts: int = 5):
         self.window_minutes = window_minutes
         self.max_attempts = max_attempts
-        self.attempts: Dict[str, List[datetime]] = {}
-
-    def _clean_old_attempts(self, key: str) -> None:
-        """Remove attempts outside the current window"""
-        now = datetime.utcnow()
-        window_start = now - timedelta(minutes=self.window_minutes)
-        self.attempts[key] = [
-            attempt for attempt in self.attempts.get(key, [])
-            if attempt > window_start
-        ]
+        self.limiter = SlidingWindowLimiter(
+            max_attempts,
+            window_minutes * 60,
+            store=create_store_from_env("login")
+        )
 
     def check_rate_limit(self, username: str, request: Request) -> None:
         """
@@ -23,28 +424,24 @@ class RateLimiter:
         Raises HTTPException if rate limit is exceeded.
         """
         key = f"{username}:{request.client.host}"
-        self._clean_old_attempts(key)
+        wait_seconds = self.limiter.check(key)
 
-        if len(self.attempts.get(key, [])) >= self.max_attempts:
-            wait_minutes = self.window_minutes - (
-                datetime.utcnow() - min(self.attempts[key])
-            ).total_seconds() / 60
+        if wait_seconds:
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Too many login attempts. Please try again in {int(wait_minutes)} minutes."
+                detail=f"Too many login attempts. Please try again in {math.ceil(wait_seconds / 60)} minutes.",
+                headers={"Retry-After": str(math.ceil(wait_seconds))}
             )
 
     def record_attempt(self, username: str, request: Request) -> None:
         """Record a failed login attempt"""
         key = f"{username}:{request.client.host}"
-        if key not in self.attempts:
-            self.attempts[key] = []
-        self.attempts[key].append(datetime.utcnow())
+        self.limiter.add(key)
 
     def clear_attempts(self, username: str, request: Request) -> None:
         """Clear attempts after successful login"""
         key = f"{username}:{request.client.host}"
-        self.attempts.pop(key, None)
+        self.limiter.reset(key)
 
 # Create a global rate limiter instance
 login_rate_limiter = RateLimiter()
@@ -0,0 +1,274 @@
+"""
+Resilience primitives for calls to upstream services: a circuit breaker
+that fails fast while the upstream is unhealthy, a retry budget that caps
+retries to a fraction of traffic, and an UpstreamGuard that combines them
+with jittered retries and optional hedged requests.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from admission import AdmissionController
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the breaker is open"""
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout  # seconds before a probe is let through
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def acquire(self) -> None:
+        """Allow a call through or raise CircuitOpenError"""
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            # Only one probe at a time while deciding whether to close again
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.reset_timeout)
+            self._probe_in_flight = True
+
+    def release(self) -> None:
+        """Release a call that was cancelled before it had an outcome"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+        }
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of requests, so retries
+    cannot multiply load on an upstream that is already struggling.
+    """
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, max_tokens: float = 10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated_at = time.monotonic()
+
+    def _refill(self, amount: float) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + amount)
+
+    def record_request(self) -> None:
+        self._refill(self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry token if available"""
+        now = time.monotonic()
+        self._refill((now - self.updated_at) * self.min_per_second)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+class UpstreamGuard:
+    """
+    Runs upstream calls through a circuit breaker with bounded, jittered
+    retries under a retry budget. If hedge_percentile is set, a second
+    request is started when the first is slower than that latency
+    percentile, and whichever succeeds first wins.
+    With an admission controller every attempt, hedges included, holds its
+    own slot, so retries give their slot back while backing off and a hedge
+    is only sent when a slot is free without queueing.
+    """
+    def __init__(
+        self,
+        is_retryable: Callable[[BaseException], bool],
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        hedge_percentile: float = 0,
+        hedge_min_samples: int = 20,
+        admission: Optional[AdmissionController] = None,
+    ):
+        self.is_retryable = is_retryable
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.admission = admission
+        self.latencies = LatencyTracker()
+        self.calls = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.hedges = 0
+        self.hedges_skipped = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        self.budget.record_request()
+        attempt = 1
+        while True:
+            try:
+                async with self._slot():
+                    return await self._call_once(fn)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if not self.is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                if not self.budget.try_spend():
+                    self.retries_denied += 1
+                    raise
+                self.retries += 1
+                # Full jitter exponential backoff, without holding a slot
+                await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                attempt += 1
+
+    async def _call_once(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """One attempt through the breaker; the caller holds the admission slot"""
+        try:
+            self.breaker.acquire()
+        except CircuitOpenError:
+            self.rejected += 1
+            raise
+        try:
+            result = await self._attempt(fn)
+        except Exception as e:
+            if self.is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                # The upstream answered; the request itself was bad
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return result
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self.admission is None:
+            yield
+            return
+        async with self.admission.slot():
+            yield
+
+    def _hedge_slot_free(self) -> bool:
+        # A hedge only uses spare capacity and never queues ahead of new callers
+        admission = self.admission
+        return admission is None or (admission.waiting == 0 and admission.in_flight < admission.max_concurrent)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.latencies.samples) < self.hedge_min_samples:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        result = await fn()
+        self.latencies.add(time.monotonic() - started)
+        return result
+
+    async def _hedge(self, fn: Callable[[], Awaitable[T]]) -> T:
+        async with self._slot():
+            return await self._timed(fn)
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]]) -> T:
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await self._timed(fn)
+
+        primary = asyncio.create_task(self._timed(fn))
+        hedge = None
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and not self._hedge_slot_free():
+                self.hedges_skipped += 1
+            elif not done and self.budget.try_spend():
+                self.hedges += 1
+                hedge = asyncio.create_task(self._hedge(fn))
+                tasks.add(hedge)
+
+            pending = tasks
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict:
+        return {
+            "breaker": self.breaker.get_stats(),
+            "calls": self.calls,
+            "rejected_while_open": self.rejected,
+            "retries": self.retries,
+            "retries_denied": self.retries_denied,
+            "retry_tokens": round(self.budget.tokens, 2),
+            "hedges": self.hedges,
+            "hedges_skipped": self.hedges_skipped,
+            "hedge_wins": self.hedge_wins,
+            "latency_p50": self.latencies.percentile(50),
+            "latency_p95": self.latencies.percentile(95),
+        }
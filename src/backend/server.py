@@ -1,20 +1,43 @@
 # backend/server.py
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from datetime import datetime, timedelta
-import httpx
+import asyncio
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
-from typing import Optional, List
-from pydantic import BaseModel
-from database import get_db_connection, get_invitation_code, get_all_invitation_codes, increment_call_count
+from typing import Optional, List, Tuple
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from database import close_db_pool as close_sync_db_pool
+from database import get_db_config, compute_is_valid, build_codes_query, CODE_FIELDS, CONSUME_OK, CONSUME_NOT_FOUND, CONSUME_EXPIRED, CONSUME_EXHAUSTED, ChangeHistoryExpiredError
+from database_async import (
+    get_invitation_code, list_invitation_codes, iter_invitation_codes, increment_call_count, get_admin,
+    get_change_version, list_code_changes, prune_count_log,
+    consume_invitation_code, release_invitation_code, open_db_pool, close_db_pool, get_pool_stats,
+    stream_codes, apply_call_count_deltas, get_db_connection, code_notify_installed,
+    admin_notify_installed
+)
+from elevenlabs_client import open_client, close_client, fetch_signed_url, upstream_guard, upstream_admission
+from signed_url_pool import create_pool_from_env
+from rate_limit import SlidingWindowLimiter, create_store_from_env, close_stores, login_rate_limiter
+from middleware import RateLimitMiddleware, TimingMiddleware, bearer_token
+from passwords import password_pool, print_calibration
+from code_cache import code_cache
+from code_filter import code_filter
+from event_bus import event_bus
+from usage_buffer import create_buffer_from_env
+from code_export import EXPORT_FORMATS, export_csv, export_ndjson
+from bulk_codes import prepare_rows, load_codes_async, CodeSpaceError
+from admission import OverloadedError
+from static_assets import PrecompressedStaticFiles, asset_response, precompress, get_stats as static_asset_stats
 from auth import (
-    create_access_token, get_current_admin, ACCESS_TOKEN_EXPIRE_MINUTES,
-    jwt, ALGORITHM, SECRET_KEY, JWTError
+    create_access_token, get_current_admin, get_current_admin_claims, ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWTError, create_tokens, decode_token, admin_exists, cache_admin, invalidate_admin,
+    admin_cache_stats, token_cache_stats, ADMIN_CHANGES_CHANNEL
 )
 
 # Load environment variables
@@ -24,43 +47,127 @@ load_dotenv()
 SSL_KEYFILE = os.getenv("SSL_KEY_PATH")
 SSL_CERTFILE = os.getenv("SSL_CERT_PATH")
 
-app = FastAPI()
-
-# Rate limiting middleware
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, window_size=60, max_requests=10):
-        super().__init__(app)
-        self.window_size = window_size  # seconds
-        self.max_requests = max_requests
-        self.requests = {}  # ip -> list of timestamps
-
-    async def dispatch(self, request, call_next):
-        # Skip rate limiting for static files and admin routes
-        if request.url.path.startswith('/static') or request.url.path.startswith('/admin'):
-            return await call_next(request)
-
-        # Get client IP
-        client_ip = request.client.host
-        now = datetime.utcnow()
-
-        # Initialize or clean up old requests
-        if client_ip not in self.requests:
-            self.requests[client_ip] = []
-        self.requests[client_ip] = [ts for ts in self.requests[client_ip] 
-                                  if (now - ts).seconds < self.window_size]
-
-        # Check rate limit
-        if len(self.requests[client_ip]) >= self.max_requests:
-            raise HTTPException(
-                status_code=429,
-                detail="Too many requests. Please try again later."
-            )
+# New codes reach the negative filter, and all changes reach live admin
+# dashboards, through the cache's change notifications
+code_cache.subscribe(code_filter.on_code_change)
+code_cache.subscribe(event_bus.on_code_change)
+# Created, changed and deleted admins leave the principal cache at once
+code_cache.listen(ADMIN_CHANGES_CHANNEL, invalidate_admin)
+
+def invalidate_codes(codes: List[str]) -> None:
+    """Drop codes from the cache once their buffered calls are written"""
+    for code in codes:
+        code_cache.invalidate(code)
+
+# Write-behind call counting, enabled with USAGE_WRITE_BEHIND=1
+usage_buffer = create_buffer_from_env(apply_call_count_deltas, on_flush=invalidate_codes)
+
+def unflushed_calls(code: str) -> int:
+    """Calls counted in memory but not yet written to the database"""
+    return usage_buffer.unflushed(code) if usage_buffer else 0
+
+# Pre-fetched signed URLs, enabled with SIGNED_URL_POOL_SIZE
+signed_url_pool = create_pool_from_env(fetch_signed_url)
+
+# Counter change log retention; syncs from older versions need a full reload
+CHANGE_LOG_RETENTION = timedelta(hours=float(os.getenv("CHANGE_LOG_RETENTION_HOURS", "24")))
+CHANGE_LOG_PRUNE_INTERVAL = float(os.getenv("CHANGE_LOG_PRUNE_SECONDS", "600"))
+
+async def prune_change_log() -> None:
+    """Prune the counter change log every CHANGE_LOG_PRUNE_INTERVAL seconds"""
+    while True:
+        try:
+            pruned = await prune_count_log(CHANGE_LOG_RETENTION)
+            if pruned:
+                print(f"Pruned {pruned} counter change log entries")
+        except Exception as e:
+            print(f"Counter change log prune failed: {e}")
+        await asyncio.sleep(CHANGE_LOG_PRUNE_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown"""
+    # The sync pool only served setup on import (auth.init_admin_table)
+    close_sync_db_pool()
+    await open_db_pool()
+    # Listen before building the filter so codes created meanwhile are not missed
+    code_cache.start(get_db_config())
+    if os.getenv("CODE_FILTER_ENABLED", "1") == "1":
+        # New codes only reach the filter through the notify trigger
+        if await code_notify_installed():
+            await code_filter.start(stream_codes)
+        else:
+            print("Invitation code filter disabled: invitation_codes_notify trigger missing, run migrate_add_code_notify.py")
+    if not await admin_notify_installed():
+        print("Admin changes only reach the admin cache after ADMIN_CACHE_TTL: admins_notify trigger missing, run migrate_add_admin_notify.py")
+    open_client()
+    event_bus.start()
+    if usage_buffer:
+        usage_buffer.start()
+    if signed_url_pool:
+        signed_url_pool.start()
+    prune_task = asyncio.create_task(prune_change_log())
+    if os.getenv("BCRYPT_CALIBRATE") == "1":
+        target_ms = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+        await asyncio.get_running_loop().run_in_executor(None, print_calibration, target_ms)
+    yield
+    prune_task.cancel()
+    if signed_url_pool:
+        await signed_url_pool.stop()
+    await close_client()
+    password_pool.shutdown()
+    close_stores()
+    if usage_buffer:
+        await usage_buffer.stop()
+    await event_bus.stop()
+    await code_filter.stop()
+    await code_cache.stop()
+    await close_db_pool()
+
+# orjson serializes several times faster than the standard json module
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-        # Add current request
-        self.requests[client_ip].append(now)
-        return await call_next(request)
+def trusted_response(content, **kwargs) -> ORJSONResponse:
+    """
+    Return data produced by our own queries as-is, skipping FastAPI's
+    response validation and jsonable_encoder pass. Only for content made of
+    types orjson handles natively (dicts, lists, str, numbers, datetimes).
+    """
+    return ORJSONResponse(content, **kwargs)
 
-app.add_middleware(RateLimitMiddleware)
+# Request-path middleware (pure ASGI). Starlette runs the last added
+# middleware first: CORS, then timing, then rate limiting.
+request_rate_limiter = SlidingWindowLimiter(
+    int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "10")),
+    int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60")),
+    store=create_store_from_env("requests")
+)
+# Authenticated admins get their own, larger budget: the dashboard's search,
+# paging, sync and event reconnects would soon exhaust the per-IP one
+admin_rate_limiter = SlidingWindowLimiter(
+    int(os.getenv("ADMIN_RATE_LIMIT_MAX_REQUESTS", "300")),
+    int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60")),
+    store=create_store_from_env("admin_requests")
+)
+
+def admin_rate_limit_key(scope) -> Optional[str]:
+    """The admin whose valid access token a request carries, if any"""
+    token = bearer_token(scope)
+    if token is None:
+        return None
+    try:
+        claims = decode_token(token)
+    except JWTError:
+        return None
+    return claims.get("sub") if claims.get("type") == "access" else None
+
+app.add_middleware(
+    RateLimitMiddleware,
+    limiter=request_rate_limiter,
+    admin_limiter=admin_rate_limiter,
+    admin_key=admin_rate_limit_key
+)
+app.add_middleware(TimingMiddleware)
 
 # CORS middleware configuration
 # Get allowed origins from environment variable
@@ -88,14 +195,20 @@ class RefreshRequest(BaseModel):
 class InvitationCodeBase(BaseModel):
     code: str
 
-class InvitationCodeResponse(InvitationCodeBase):
-    first_name: Optional[str] = None
-    last_name: Optional[str] = None
-    created_at: datetime
-    expires_at: datetime
-    max_calls: int
-    call_count: int
-    is_valid: bool
+class BulkCodeRow(BaseModel):
+    code: Optional[str] = Field(None, max_length=50)
+    first_name: Optional[str] = Field(None, max_length=100)
+    last_name: Optional[str] = Field(None, max_length=100)
+    expires_at: Optional[datetime] = None
+    max_calls: Optional[int] = Field(None, ge=0)
+
+class BulkCodeRequest(BaseModel):
+    count: int = Field(0, ge=0, le=50_000)  # codes without names, in addition to rows
+    rows: List[BulkCodeRow] = Field(default_factory=list, max_length=50_000)
+    days_valid: int = Field(30, ge=1)
+    max_calls: int = Field(10, ge=0)
+    length: int = Field(8, ge=6, le=32)
+    prefix: str = Field("", max_length=18)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -106,18 +219,16 @@ async def login_for_access_token(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    from auth import get_admin, verify_password
-    from rate_limit import login_rate_limiter
-    
     # Check rate limit before processing login
     login_rate_limiter.check_rate_limit(form_data.username, request)
     
     print(f"Login attempt for username: {form_data.username}")
-    admin = get_admin(form_data.username)
+    admin = await get_admin(form_data.username)
     print(f"Admin lookup result: {admin}")
     
     if not admin:
         print("Admin not found")
+        invalidate_admin(form_data.username)
         login_rate_limiter.record_attempt(form_data.username, request)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -125,7 +236,15 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(form_data.password, admin["hashed_password"]):
+    try:
+        password_ok = await password_pool.verify(form_data.password, admin["hashed_password"])
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if not password_ok:
         print("Password verification failed")
         login_rate_limiter.record_attempt(form_data.username, request)
         raise HTTPException(
@@ -136,9 +255,9 @@ async def login_for_access_token(
     
     # Clear rate limit attempts on successful login
     login_rate_limiter.clear_attempts(form_data.username, request)
+    cache_admin(form_data.username)
     
     # Generate both access and refresh tokens
-    from auth import create_tokens
     return create_tokens(form_data.username)
 
 # Token refresh endpoint
@@ -147,7 +266,7 @@ async def refresh_token(refresh_request: RefreshRequest):
     """Get a new access token using a refresh token"""
     try:
         # Verify the refresh token
-        payload = jwt.decode(refresh_request.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(refresh_request.refresh_token)
         username: str = payload.get("sub")
         token_type: str = payload.get("type")
         
@@ -164,8 +283,7 @@ async def refresh_token(refresh_request: RefreshRequest):
             )
             
         # Check if the admin still exists
-        admin = get_admin(username)
-        if admin is None:
+        if not await admin_exists(username):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User no longer exists",
@@ -181,18 +299,37 @@ async def refresh_token(refresh_request: RefreshRequest):
         )
 
 # Invitation code endpoints
+# Status code and message for each reason a code can be rejected
+CODE_REJECTIONS = {
+    CONSUME_NOT_FOUND: (404, "Invalid invitation code"),
+    CONSUME_EXPIRED: (400, "Invitation code has expired"),
+    CONSUME_EXHAUSTED: (400, "Maximum number of calls reached"),
+}
+
+def reject_code(reason: str):
+    """Raise the HTTP error matching a code rejection reason"""
+    status_code, detail = CODE_REJECTIONS[reason]
+    raise HTTPException(status_code=status_code, detail=detail, headers={"X-Code-Status": reason})
+
 @app.post("/api/validate-code")
 async def validate_code(code_data: InvitationCodeBase):
     """Validate an invitation code"""
-    code = get_invitation_code(code_data.code)
+    if not code_filter.might_exist(code_data.code):
+        reject_code(CONSUME_NOT_FOUND)
+    code = await code_cache.get(code_data.code, get_invitation_code)
     if not code:
-        raise HTTPException(status_code=404, detail="Invalid invitation code")
+        code_filter.record_false_positive()
+        reject_code(CONSUME_NOT_FOUND)
+    pending = unflushed_calls(code_data.code)
+    if pending:
+        code['call_count'] += pending
+        code['is_valid'] = compute_is_valid(code)
     
     if not code['is_valid']:
         if datetime.utcnow() >= code['expires_at']:
-            raise HTTPException(status_code=400, detail="Invitation code has expired")
+            reject_code(CONSUME_EXPIRED)
         else:
-            raise HTTPException(status_code=400, detail="Maximum number of calls reached")
+            reject_code(CONSUME_EXHAUSTED)
     
     return {
         "valid": True,
@@ -204,49 +341,300 @@ async def validate_code(code_data: InvitationCodeBase):
 @app.post("/api/increment-code")
 async def increment_code_usage(code_data: InvitationCodeBase):
     """Increment the call count for an invitation code"""
-    success = increment_call_count(code_data.code)
+    if usage_buffer:
+        exists = (
+            code_filter.might_exist(code_data.code) and
+            await code_cache.get(code_data.code, get_invitation_code) is not None
+        )
+        if not exists:
+            raise HTTPException(status_code=404, detail="Invalid invitation code")
+        usage_buffer.add(code_data.code)
+        return {"success": True}
+    success = await increment_call_count(code_data.code)
+    code_cache.invalidate(code_data.code)
     if not success:
         raise HTTPException(status_code=404, detail="Invalid invitation code")
     return {"success": True}
 
-@app.get("/api/codes", response_model=List[InvitationCodeResponse])
-async def list_codes(current_admin: str = Depends(get_current_admin)):
-    """List all invitation codes (admin only)"""
-    return get_all_invitation_codes()
+@app.post("/api/consume-code")
+async def consume_code(code_data: InvitationCodeBase):
+    """Validate an invitation code and use one of its calls in a single step"""
+    if not code_filter.might_exist(code_data.code):
+        reject_code(CONSUME_NOT_FOUND)
+    pending = unflushed_calls(code_data.code)
+    outcome, code = await consume_invitation_code(code_data.code, pending)
+    if outcome != CONSUME_OK:
+        if outcome == CONSUME_NOT_FOUND:
+            code_filter.record_false_positive()
+        reject_code(outcome)
+    code_cache.put(code)
+
+    return {
+        "valid": True,
+        "code": code['code'],
+        "first_name": code.get('first_name'),
+        "last_name": code.get('last_name'),
+        "calls_remaining": code['max_calls'] - code['call_count'] - pending
+    }
+
+def code_list_filters(
+    fields: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    name_prefix: Optional[str] = None,
+    code_prefix: Optional[str] = None,
+) -> dict:
+    """
+    Query parameters shared by the code listing endpoints: `fields` is a
+    comma-separated subset of id, code, first_name, last_name, created_at,
+    expires_at, max_calls, call_count and is_valid; `status` is one of
+    valid, expired or exhausted; `name_prefix` matches first or last name
+    case-insensitively.
+    """
+    return {
+        "fields": [field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+        "status": status_filter,
+        "name_prefix": name_prefix,
+        "code_prefix": code_prefix,
+    }
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header lists etag"""
+    header = request.headers.get("if-none-match", "")
+    return any(tag.strip() in (etag, "*") for tag in header.split(","))
+
+@app.get("/api/codes")
+async def list_codes(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    filters: dict = Depends(code_list_filters),
+    current_admin: str = Depends(get_current_admin)
+):
+    """
+    List invitation codes newest first, one page at a time (admin only).
+    Pass next_cursor back as `cursor` to get the following page, and
+    `version` to /api/codes/changes as `since` to sync later changes.
+    Responses carry a strong ETag; If-None-Match gets a 304 when no code
+    has changed or expired since.
+    """
+    # Read before the page, so changes made meanwhile are picked up by the next sync
+    version = await get_change_version()
+    cache_headers = {}
+    if version is not None:
+        fingerprint = f"{version['version']}|{version['recent']}|{version['last_expiry']}|{request.url.query}"
+        etag = '"' + hashlib.sha256(fingerprint.encode()).hexdigest()[:32] + '"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=cache_headers)
+
+    try:
+        codes, next_cursor = await list_invitation_codes(limit, cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return trusted_response(
+        {"codes": codes, "next_cursor": next_cursor, "version": str(version["version"]) if version else None},
+        headers=cache_headers
+    )
+
+@app.get("/api/codes/changes")
+async def list_codes_changed_since(
+    since: str = Query(..., max_length=100),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_admin: str = Depends(get_current_admin)
+):
+    """
+    Codes created, updated or deleted since change version `since` (admin
+    only). Call again with the returned cursor as `since` while has_more is
+    true. Expiry changes no row; clients should derive it from expires_at.
+    Answers 501 when change tracking is not installed and 410 when `since`
+    is older than the kept history; reload /api/codes then.
+    """
+    try:
+        changes = await list_code_changes(since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ChangeHistoryExpiredError as e:
+        raise HTTPException(status_code=410, detail=f"{e}; reload the full list from /api/codes")
+    if changes is None:
+        raise HTTPException(
+            status_code=501,
+            detail="Change tracking is not installed; reload the full list from /api/codes"
+        )
+    return trusted_response(changes)
+
+@app.post("/api/codes/bulk")
+async def create_codes_bulk(request: BulkCodeRequest, current_admin: str = Depends(get_current_admin)):
+    """Create many invitation codes in one transaction (admin only)"""
+    if not request.count and not request.rows:
+        raise HTTPException(status_code=400, detail="Nothing to create")
+    rows = prepare_rows(
+        count=request.count,
+        rows=[row.model_dump() for row in request.rows],
+        days_valid=request.days_valid,
+        max_calls=request.max_calls,
+        length=request.length,
+        prefix=request.prefix,
+    )
+    try:
+        async with get_db_connection() as conn:
+            result = await load_codes_async(conn, rows, request.length, request.prefix)
+    except CodeSpaceError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    # Usable right away, even before the change notifications arrive
+    for row in result["created"]:
+        code_filter.add(row["code"])
+    print(f"Admin {current_admin} created {len(result['created'])} codes "
+          f"({result['codes_per_second'] or 0:.0f} codes/s)")
+    return trusted_response(result)
+
+@app.get("/api/codes/export")
+async def export_codes(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    filters: dict = Depends(code_list_filters),
+    current_admin: str = Depends(get_current_admin)
+):
+    """
+    Stream every invitation code matching the listing filters as CSV or
+    NDJSON (admin only)
+    """
+    try:
+        # Reject bad parameters before the response starts
+        build_codes_query(**filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = iter_invitation_codes(**filters)
+    if export_format == "csv":
+        body = export_csv(rows, filters["fields"] or list(CODE_FIELDS))
+    else:
+        body = export_ndjson(rows)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="invitation_codes.{export_format}"'}
+    )
+
+@app.get("/api/events")
+async def code_events(claims: dict = Depends(get_current_admin_claims)):
+    """
+    Server-Sent Events stream of invitation code changes (admin only).
+    `codes` events carry a list of {op, code} changes, newest state per
+    code; `resync` means updates were missed and the list should be reloaded.
+    The stream ends with an `expired` event when the access token expires.
+    """
+    expires_at = claims["exp"]
+
+    async def stream():
+        with event_bus.subscribe() as queue:
+            yield "retry: 5000\nevent: ready\ndata: {}\n\n"
+            while True:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    yield "event: expired\ndata: {}\n\n"
+                    return
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=min(15, remaining))
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/metrics")
+async def get_metrics(current_admin: str = Depends(get_current_admin)):
+    """Runtime statistics for monitoring (admin only)"""
+    return {
+        "db_pool": get_pool_stats(),
+        "code_cache": code_cache.get_stats(),
+        "code_filter": code_filter.get_stats(),
+        "usage_buffer": usage_buffer.get_stats() if usage_buffer else None,
+        "events": event_bus.get_stats(),
+        "static_assets": static_asset_stats(),
+        "rate_limit": {
+            "requests": request_rate_limiter.get_stats(),
+            "admin_requests": admin_rate_limiter.get_stats(),
+            "login": login_rate_limiter.limiter.get_stats()
+        },
+        "signed_url_pool": signed_url_pool.get_stats() if signed_url_pool else None,
+        "admin_cache": admin_cache_stats,
+        "token_cache": token_cache_stats,
+        "password_hashing": password_pool.get_stats(),
+        "elevenlabs": upstream_guard.get_stats(),
+        "elevenlabs_admission": upstream_admission.get_stats()
+    }
 
 # ElevenLabs API endpoints
+async def obtain_signed_url_entry() -> Tuple[float, str]:
+    """Get (fetched_at, url) from the pre-fetched pool if enabled, otherwise live"""
+    if signed_url_pool:
+        return await signed_url_pool.get_entry()
+    return time.monotonic(), await fetch_signed_url()
+
+async def obtain_signed_url() -> str:
+    """Get a signed URL from the pre-fetched pool if enabled, otherwise live"""
+    return (await obtain_signed_url_entry())[1]
+
+def discard_signed_url(task: asyncio.Task) -> None:
+    """
+    Drop a signed URL fetch that is no longer needed. With the pool enabled
+    the fetch finishes and its URL goes back to the pool; otherwise it is
+    cancelled.
+    """
+    if signed_url_pool is None:
+        task.cancel()
+
+    def finish(task: asyncio.Task) -> None:
+        # Retrieving the exception keeps a failed fetch from being logged as unhandled
+        if not task.cancelled() and task.exception() is None and signed_url_pool:
+            signed_url_pool.give_back(task.result())
+    task.add_done_callback(finish)
+
 @app.get("/api/signed-url")
 async def get_signed_url():
-    agent_id = os.getenv("AGENT_ID")
-    xi_api_key = os.getenv("XI_API_KEY")
-    
-    if not agent_id or not xi_api_key:
-        raise HTTPException(status_code=500, detail="Missing AGENT_ID or XI_API_KEY environment variables")
-    
-    url = f"https://api.elevenlabs.io/v1/convai/conversation/get_signed_url?agent_id={agent_id}"
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            print(f"\n=== REQUEST ===\nURL: {url}\nHeaders: {{'xi-api-key': '*****'}}\n")
-            
-            response = await client.get(
-                url,
-                headers={
-                    "xi-api-key": xi_api_key
-                }
-            )
-            
-            print(f"\n=== RESPONSE ===\nStatus: {response.status_code}\nHeaders: {dict(response.headers)}\nBody: {response.text}\n")
-            
-            response.raise_for_status()
-            data = response.json()
-            return {"signedUrl": data["signed_url"]}
-            
-        except httpx.HTTPError as e:
-            print(f"Error from ElevenLabs API: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response content: {e.response.content}")
-            raise HTTPException(status_code=500, detail=f"Failed to get signed URL: {str(e)}")
+    return {"signedUrl": await obtain_signed_url()}
+
+@app.post("/api/start-session")
+async def start_session(code_data: InvitationCodeBase):
+    """
+    Consume an invitation code and fetch a signed URL concurrently.
+    A URL left unused by a rejected code goes back to the pool, and the call
+    is given back if the signed URL cannot be obtained.
+    """
+    if not code_filter.might_exist(code_data.code):
+        reject_code(CONSUME_NOT_FOUND)
+    signed_url_task = asyncio.create_task(obtain_signed_url_entry())
+    try:
+        pending = unflushed_calls(code_data.code)
+        outcome, code = await consume_invitation_code(code_data.code, pending)
+    except BaseException:
+        discard_signed_url(signed_url_task)
+        raise
+    if outcome != CONSUME_OK:
+        discard_signed_url(signed_url_task)
+        if outcome == CONSUME_NOT_FOUND:
+            code_filter.record_false_positive()
+        reject_code(outcome)
+    code_cache.put(code)
+
+    try:
+        _, signed_url = await signed_url_task
+    except BaseException:
+        await release_invitation_code(code_data.code)
+        code_cache.invalidate(code_data.code)
+        raise
+
+    return {
+        "signedUrl": signed_url,
+        "code": code['code'],
+        "first_name": code.get('first_name'),
+        "last_name": code.get('last_name'),
+        "calls_remaining": code['max_calls'] - code['call_count'] - pending
+    }
 
 #API route for getting Agent ID, used for public agents
 @app.get("/api/getAgentId")
@@ -256,7 +644,7 @@ def get_unsigned_url():
 
 # Serve admin page
 @app.get("/admin")
-async def serve_admin():
+async def serve_admin(request: Request):
     # Try multiple possible paths for admin.html
     admin_paths = [
         "../frontend/dist/admin.html",  # Local development
@@ -276,23 +664,27 @@ async def serve_admin():
             status_code=500,
             detail="admin.html not found. Please ensure the frontend build was successful."
         )
-    return FileResponse(admin_path)
+    return asset_response(admin_path, request.headers, request.method)
 
 # Mount static files from frontend build directory
+dist_dir = "../../dist"
 static_dir = "../../dist/static"  # Single, consistent path
 if os.path.exists(static_dir):
+    # Normally done by the build; only files without current variants are compressed here
+    compressed = precompress(dist_dir)
+    print(f"Precompressed build assets: {compressed['written']} variants written, {compressed['files']} files compressible")
     print(f"Mounting static files from: {os.path.abspath(static_dir)}")
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+    app.mount("/static", PrecompressedStaticFiles(directory=static_dir), name="static")
 else:
     raise RuntimeError(f"Static directory not found: {os.path.abspath(static_dir)}. Run 'npm run build' first.")
 
 # Serve index.html for root path
 @app.get("/")
-async def serve_index():
+async def serve_index(request: Request):
     index_path = "../../dist/index.html"
     if not os.path.exists(index_path):
         raise HTTPException(
             status_code=500,
             detail=f"index.html not found at {os.path.abspath(index_path)}. Run 'npm run build' first."
         )
-    return FileResponse(index_path)
\ No newline at end of file
+    return asset_response(index_path, request.headers, request.method)
\ No newline at end of file
@@ -9,6 +9,7 @@ import psycopg
 from getpass import getpass
 import sys
 import os
+from database import create_code_tables, ADMIN_NOTIFY_TRIGGER_SQL
 
 def get_connection_params():
     """Get database connection parameters from environment or user input"""
@@ -75,20 +76,16 @@ def setup_tables(conn_string: str):
                         created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
                     )
                 """)
+                with conn.transaction():
+                    cur.execute(ADMIN_NOTIFY_TRIGGER_SQL)
                 
-                # Invitation codes table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS invitation_codes (
-                        id SERIAL PRIMARY KEY,
-                        code VARCHAR(50) UNIQUE NOT NULL,
-                        first_name VARCHAR(100),
-                        last_name VARCHAR(100),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        expires_at TIMESTAMP NOT NULL,
-                        max_calls INTEGER NOT NULL,
-                        call_count INTEGER DEFAULT 0
-                    )
-                """)
+                # Invitation codes table, with the indexes and triggers of a migrated database
+                cur.execute("SELECT to_regclass('invitation_codes') IS NOT NULL")
+                if cur.fetchone()[0]:
+                    print("invitation_codes already exists; run the migrate_*.py scripts to update it")
+                else:
+                    with conn.transaction():
+                        create_code_tables(cur)
                 
                 print("Database tables created successfully!")
                 
@@ -0,0 +1,165 @@
+"""
+Background pool of pre-fetched ElevenLabs signed URLs.
+Keeps a target number of fresh URLs ready so a conversation start is a
+memory lookup instead of an upstream round-trip. URLs are evicted before
+they expire and the pool refills asynchronously; when it is empty callers
+fall back to a live fetch.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+class SignedUrlPool:
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[str]],
+        target_size: int = 5,
+        max_age: float = 600,
+        refill_concurrency: int = 2,
+        retry_delay: float = 5,
+    ):
+        self.fetch = fetch
+        self.target_size = target_size
+        self.max_age = max_age  # seconds, kept well below the upstream expiry
+        self.refill_concurrency = refill_concurrency
+        self.retry_delay = retry_delay
+        self.urls: Deque[Tuple[float, str]] = deque()  # (fetched_at, url), oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.returned = 0  # handed out but given back unused
+        self.refill_latencies: Deque[float] = deque(maxlen=200)
+        # Created by start() inside the running loop (Python 3.9 binds it on creation)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background refill loop"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        """Stop the refill loop and drop pooled URLs"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.urls.clear()
+
+    def _evict_stale(self) -> None:
+        cutoff = time.monotonic() - self.max_age
+        while self.urls and self.urls[0][0] < cutoff:
+            self.urls.popleft()
+            self.evictions += 1
+
+    def take_entry(self) -> Optional[Tuple[float, str]]:
+        """Take a fresh pooled (fetched_at, url), or None if the pool is empty"""
+        self._evict_stale()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self.urls:
+            self.hits += 1
+            # Newest first, so older URLs age out instead of being handed out near expiry
+            return self.urls.pop()
+        self.misses += 1
+        return None
+
+    def take(self) -> Optional[str]:
+        """Take a fresh pooled URL, or None if the pool is empty"""
+        entry = self.take_entry()
+        return entry[1] if entry else None
+
+    async def get_entry(self) -> Tuple[float, str]:
+        """Get a (fetched_at, url) from the pool, falling back to a live fetch"""
+        entry = self.take_entry()
+        if entry is not None:
+            return entry
+        url = await self.fetch()
+        return time.monotonic(), url
+
+    async def get(self) -> str:
+        """Get a signed URL from the pool, falling back to a live fetch"""
+        return (await self.get_entry())[1]
+
+    def give_back(self, entry: Tuple[float, str]) -> None:
+        """Return an unused (fetched_at, url) from get_entry, unless it is stale or the pool is full"""
+        if entry[0] < time.monotonic() - self.max_age or len(self.urls) >= self.target_size:
+            return
+        self.returned += 1
+        # Keep the deque ordered by fetch time
+        index = len(self.urls)
+        while index > 0 and self.urls[index - 1][0] > entry[0]:
+            index -= 1
+        self.urls.insert(index, entry)
+
+    async def _fetch_one(self) -> None:
+        started = time.monotonic()
+        try:
+            url = await self.fetch()
+        except Exception as e:
+            self.refill_failures += 1
+            print(f"Signed URL pool refill failed: {e}")
+            raise
+        self.refill_latencies.append(time.monotonic() - started)
+        self.refills += 1
+        self.urls.append((time.monotonic(), url))
+
+    async def _refill_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            self._evict_stale()
+            missing = self.target_size - len(self.urls)
+            if missing > 0:
+                batch = min(missing, self.refill_concurrency)
+                results = await asyncio.gather(
+                    *(self._fetch_one() for _ in range(batch)),
+                    return_exceptions=True
+                )
+                if any(isinstance(r, Exception) for r in results):
+                    await asyncio.sleep(self.retry_delay)
+                continue
+
+            # Sleep until a URL is taken or the oldest one is due for eviction
+            next_eviction = self.urls[0][0] + self.max_age - time.monotonic()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(next_eviction, 0.1))
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> Dict:
+        """Pool size, hit rate and refill latency"""
+        requests = self.hits + self.misses
+        latencies = sorted(self.refill_latencies)
+        return {
+            "size": len(self.urls),
+            "target_size": self.target_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else None,
+            "evictions": self.evictions,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+            "returned": self.returned,
+            "refill_latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "refill_latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+        }
+
+def create_pool_from_env(fetch: Callable[[], Awaitable[str]]) -> Optional[SignedUrlPool]:
+    """Create a pool if SIGNED_URL_POOL_SIZE is set above zero"""
+    target_size = int(os.getenv("SIGNED_URL_POOL_SIZE", "0"))
+    if target_size <= 0:
+        return None
+    return SignedUrlPool(
+        fetch,
+        target_size=target_size,
+        max_age=float(os.getenv("SIGNED_URL_MAX_AGE", "600")),
+        refill_concurrency=int(os.getenv("SIGNED_URL_REFILL_CONCURRENCY", "2")),
+    )
@@ -0,0 +1,171 @@
+"""
+Precompressed, cache-friendly serving of the webpack build in dist/.
+Compressible files get .gz and .br siblings once, at build time or on server
+startup, and each request is answered with the smallest variant its
+Accept-Encoding allows. Every response carries a strong ETag derived from
+the file content and honours If-None-Match. Files whose names contain a
+webpack content hash never change under the same URL, so they are marked
+immutable and browsers stop asking for them at all.
+
+Usage: python static_assets.py [directory ...]   (precompress ahead of time)
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from typing import Dict, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".html", ".txt", ".svg", ".json", ".map"}
+MIN_COMPRESS_SIZE = 1024  # smaller files gain less than the Content-Encoding header costs
+
+# Preferred first; each maps to the sibling file suffix
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+# webpack's [contenthash] is 20 hex characters: bundle.29cfc5ba3d03b2a6a433.js
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"  # may be stored, but revalidated with If-None-Match
+
+def _compressors():
+    compressors = {"gzip": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors["br"] = lambda data: brotli.compress(data, quality=11)
+    return compressors
+
+def precompress(directory: str) -> Dict:
+    """Write .gz/.br siblings for compressible files that lack a current one"""
+    compressors = _compressors()
+    stats = {"files": 0, "written": 0, "bytes": 0, "compressed_bytes": {name: 0 for name in compressors}}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            source = os.stat(path)
+            if source.st_size < MIN_COMPRESS_SIZE:
+                continue
+            stats["files"] += 1
+            stats["bytes"] += source.st_size
+            data = None
+            for encoding, compress in compressors.items():
+                variant = path + ENCODINGS[encoding]
+                if not _is_current(variant, source):
+                    if data is None:
+                        with open(path, "rb") as f:
+                            data = f.read()
+                    compressed = compress(data)
+                    if len(compressed) >= source.st_size:
+                        continue
+                    with open(variant, "wb") as f:
+                        f.write(compressed)
+                    stats["written"] += 1
+                stats["compressed_bytes"][encoding] += os.stat(variant).st_size
+    return stats
+
+def _is_current(variant: str, source: os.stat_result) -> bool:
+    try:
+        return os.stat(variant).st_mtime_ns >= source.st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+class _Asset:
+    def __init__(self, path: str, stat_result: os.stat_result):
+        self.mtime_ns = stat_result.st_mtime_ns
+        self.size = stat_result.st_size
+        with open(path, "rb") as f:
+            self.digest = hashlib.sha256(f.read()).hexdigest()[:32]
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(os.path.basename(path)) else REVALIDATE_CACHE_CONTROL
+        self.variants: Dict[str, Tuple[str, os.stat_result]] = {}
+        for encoding, suffix in ENCODINGS.items():
+            try:
+                variant_stat = os.stat(path + suffix)
+            except FileNotFoundError:
+                continue
+            if variant_stat.st_mtime_ns >= self.mtime_ns:
+                self.variants[encoding] = (path + suffix, variant_stat)
+
+    def etag(self, encoding: str) -> str:
+        # Each representation needs its own strong validator
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+_assets: Dict[str, _Asset] = {}
+
+def _get_asset(path: str, stat_result: Optional[os.stat_result] = None) -> _Asset:
+    """Content hash and variants of a file, recomputed only when the file changes"""
+    stat_result = stat_result or os.stat(path)
+    asset = _assets.get(path)
+    if asset is None or asset.mtime_ns != stat_result.st_mtime_ns or asset.size != stat_result.st_size:
+        asset = _assets[path] = _Asset(path, stat_result)
+    return asset
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    """The preferred encoding in `available` that Accept-Encoding allows, else identity"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            weights[coding.strip()] = quality
+    for encoding in ENCODINGS:
+        if encoding in available and weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so a W/ prefix still matches
+    return any(tag.strip().replace("W/", "", 1) in (etag, "*") for tag in if_none_match.split(","))
+
+def asset_response(path: str, request_headers: Headers, method: str = "GET",
+                   status_code: int = 200, stat_result: Optional[os.stat_result] = None) -> Response:
+    """Serve a build file with compression, a strong ETag and 304 handling"""
+    asset = _get_asset(path, stat_result)
+    encoding = choose_encoding(request_headers.get("accept-encoding", ""), asset.variants)
+    headers = {"ETag": asset.etag(encoding), "Cache-Control": asset.cache_control}
+    if asset.variants:
+        headers["Vary"] = "Accept-Encoding"
+    if status_code == 200 and _etag_matches(request_headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if encoding == "identity":
+        return FileResponse(path, status_code=status_code, headers=headers, media_type=asset.media_type,
+                            stat_result=stat_result, method=method)
+    variant_path, variant_stat = asset.variants[encoding]
+    headers["Content-Encoding"] = encoding
+    return FileResponse(variant_path, status_code=status_code, headers=headers, media_type=asset.media_type,
+                        stat_result=variant_stat, method=method)
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that answers through asset_response"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        return asset_response(str(full_path), Headers(scope=scope), scope["method"], status_code, stat_result)
+
+def get_stats() -> Dict:
+    return {
+        "brotli": brotli is not None,
+        "assets": len(_assets),
+        "precompressed": sum(1 for asset in _assets.values() if asset.variants),
+    }
+
+if __name__ == "__main__":
+    for directory in sys.argv[1:] or ["../../dist"]:
+        stats = precompress(directory)
+        sizes = ", ".join(f"{name} {size / 1024:,.0f} KiB" for name, size in stats["compressed_bytes"].items())
+        print(f"{directory}: {stats['files']} files, {stats['written']} variants written, "
+              f"{stats['bytes'] / 1024:,.0f} KiB -> {sizes}")
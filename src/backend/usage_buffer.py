@@ -0,0 +1,142 @@
+"""
+Write-behind buffer for invitation code call counts.
+Increments are summed in memory per code and written as one multi-row
+UPDATE every flush interval, or sooner once enough are pending, instead of
+one transaction per call. Buffered increments are lost if the process dies
+without a graceful shutdown, so the flush interval bounds how many calls
+can go uncounted.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+class UsageBuffer:
+    def __init__(
+        self,
+        apply_deltas: Callable[[Dict[str, int]], Awaitable[List[str]]],
+        flush_interval: float = 1.0,
+        max_pending: int = 100,
+        on_flush: Optional[Callable[[List[str]], None]] = None,
+    ):
+        self.apply_deltas = apply_deltas
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending  # buffered increments that trigger an early flush
+        self.on_flush = on_flush
+        self.pending: Dict[str, int] = {}
+        # Increments being written; still counted until the write is confirmed
+        self.in_flight: Dict[str, int] = {}
+        self.pending_total = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.flushed_increments = 0
+        self.dropped_increments = 0  # buffered for codes that no longer exist
+        self.flush_sizes: Deque[int] = deque(maxlen=200)
+        self.flush_latencies: Deque[float] = deque(maxlen=200)
+        # Created inside the running loop by start() and the first flush
+        # (Python 3.9 binds them on creation)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, code: str, count: int = 1) -> None:
+        """Buffer increments for a code"""
+        self.pending[code] = self.pending.get(code, 0) + count
+        self.pending_total += count
+        if self.pending_total >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def unflushed(self, code: str) -> int:
+        """Increments for a code not yet confirmed written to the database"""
+        return self.pending.get(code, 0) + self.in_flight.get(code, 0)
+
+    async def flush(self) -> bool:
+        """Write every buffered increment; on failure they are kept for the next flush"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.pending:
+                return True
+            batch, self.pending, self.pending_total = self.pending, {}, 0
+            self.in_flight = batch
+            started = time.monotonic()
+            try:
+                updated = await self.apply_deltas(batch)
+            except Exception as e:
+                self.flush_failures += 1
+                print(f"Usage flush failed, keeping {sum(batch.values())} increments: {e}")
+                for code, count in batch.items():
+                    self.add(code, count)
+                return False
+            finally:
+                self.in_flight = {}
+
+            self.flushes += 1
+            self.flush_sizes.append(len(batch))
+            self.flush_latencies.append(time.monotonic() - started)
+            updated = set(updated)
+            dropped = sum(count for code, count in batch.items() if code not in updated)
+            self.flushed_increments += sum(batch.values()) - dropped
+            self.dropped_increments += dropped
+            if self.on_flush:
+                self.on_flush(list(batch))
+            return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not await self.flush():
+                # Back off instead of retrying immediately while the database is down
+                await asyncio.sleep(self.flush_interval)
+
+    def start(self) -> None:
+        """Start the background flush loop"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self.pending:
+            print(f"Usage buffer lost {self.pending_total} increments on shutdown")
+
+    def get_stats(self) -> Dict:
+        sizes = self.flush_sizes
+        latencies = sorted(self.flush_latencies)
+        return {
+            "pending_codes": len(self.pending),
+            "pending_increments": self.pending_total,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "flushed_increments": self.flushed_increments,
+            "dropped_increments": self.dropped_increments,
+            "avg_codes_per_flush": sum(sizes) / len(sizes) if sizes else None,
+            "flush_latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+        }
+
+def create_buffer_from_env(
+    apply_deltas: Callable[[Dict[str, int]], Awaitable[List[str]]],
+    on_flush: Optional[Callable[[List[str]], None]] = None,
+) -> Optional[UsageBuffer]:
+    """Create a buffer if USAGE_WRITE_BEHIND is enabled"""
+    if os.getenv("USAGE_WRITE_BEHIND", "0") != "1":
+        return None
+    return UsageBuffer(
+        apply_deltas,
+        flush_interval=float(os.getenv("USAGE_FLUSH_INTERVAL", "1.0")),
+        max_pending=int(os.getenv("USAGE_FLUSH_MAX_PENDING", "100")),
+        on_flush=on_flush,
+    )
@@ -5,13 +5,20 @@ import './styles/admin.css';
 let accessToken = null;
 let currentSort = { field: 'created_at', ascending: false };
 let codes = [];
+let nextCursor = null;
+let syncVersion = null;  // change version the loaded codes are current to
+let firstPageEtag = null;
+const PAGE_SIZE = 100;
 
 // DOM Elements
 const loginForm = document.getElementById('loginForm');
 const codesPanel = document.getElementById('codesPanel');
 const loginButton = document.getElementById('loginButton');
 const loginError = document.getElementById('loginError');
-const showValidOnly = document.getElementById('showValidOnly');
+const statusFilter = document.getElementById('statusFilter');
+const codePrefix = document.getElementById('codePrefix');
+const namePrefix = document.getElementById('namePrefix');
+const loadMoreButton = document.getElementById('loadMoreButton');
 const codesTable = document.getElementById('codesTable');
 
 // Event Listeners
@@ -21,9 +28,22 @@ console.log('Setting up event listeners...');
 console.log('Login button:', loginButton);
 loginButton.addEventListener('click', handleLogin);
 
-// Show valid only checkbox
-console.log('Show valid only checkbox:', showValidOnly);
-showValidOnly.addEventListener('change', filterAndDisplayCodes);
+// Filters are applied by the server, so changing one reloads the first page
+statusFilter.addEventListener('change', () => loadCodes());
+let prefixTimer = null;
+[codePrefix, namePrefix].forEach(input => {
+    input.addEventListener('input', () => {
+        clearTimeout(prefixTimer);
+        prefixTimer = setTimeout(() => loadCodes(), 300);
+    });
+});
+
+// Export button
+const exportButton = document.getElementById('exportButton');
+exportButton.addEventListener('click', exportCodes);
+
+// Load more button
+loadMoreButton.addEventListener('click', () => loadCodes(false, true));
 
 // Refresh button
 const refreshButton = document.getElementById('refreshButton');
@@ -31,7 +51,7 @@ console.log('Refresh button:', refreshButton);
 if (refreshButton) {
     refreshButton.addEventListener('click', () => {
         console.log('Refresh button clicked');
-        loadCodes(true);
+        refreshCodes();
     });
 } else {
     console.error('Refresh button not found!');
@@ -68,8 +88,9 @@ async function handleLogin() {
         loginForm.style.display = 'none';
         codesPanel.style.display = 'block';
         
-        // Load codes
+        // Load codes, then follow changes live
         await loadCodes();
+        subscribeToChanges();
     } catch (error) {
         loginError.textContent = error.message;
     } finally {
@@ -77,9 +98,55 @@ async function handleLogin() {
     }
 }
 
-// Load Codes
-async function loadCodes(isRefresh = false) {
-    console.log('Loading codes, isRefresh:', isRefresh);
+// Query parameters for the current filters
+function filterParams() {
+    const params = new URLSearchParams();
+    if (statusFilter.value) params.set('status', statusFilter.value);
+    if (codePrefix.value.trim()) params.set('code_prefix', codePrefix.value.trim());
+    if (namePrefix.value.trim()) params.set('name_prefix', namePrefix.value.trim());
+    return params;
+}
+
+// Build the listing URL for the current filters and page
+function codesUrl(cursor) {
+    const params = filterParams();
+    params.set('limit', PAGE_SIZE);
+    if (cursor) params.set('cursor', cursor);
+    return `/api/codes?${params}`;
+}
+
+// Download every code matching the current filters as CSV
+async function exportCodes() {
+    exportButton.disabled = true;
+    try {
+        const params = filterParams();
+        params.set('format', 'csv');
+        const response = await fetch(`/api/codes/export?${params}`, {
+            headers: {
+                'Authorization': `Bearer ${accessToken}`
+            }
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to export invitation codes');
+        }
+
+        const url = URL.createObjectURL(await response.blob());
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = 'invitation_codes.csv';
+        link.click();
+        URL.revokeObjectURL(url);
+    } catch (error) {
+        console.error('Error exporting codes:', error);
+    } finally {
+        exportButton.disabled = false;
+    }
+}
+
+// Load Codes: the first page, or the next one when appending
+async function loadCodes(isRefresh = false, append = false) {
+    console.log('Loading codes, isRefresh:', isRefresh, 'append:', append);
     
     const refreshButton = document.getElementById('refreshButton');
     console.log('Refresh button in loadCodes:', refreshButton);
@@ -91,21 +158,35 @@ async function loadCodes(isRefresh = false) {
     }
 
     try {
-        const response = await fetch('/api/codes', {
-            headers: {
-                'Authorization': `Bearer ${accessToken}`
-            }
-        });
+        loadMoreButton.disabled = true;
+        const headers = { 'Authorization': `Bearer ${accessToken}` };
+        // A refresh of unchanged data is answered with 304 Not Modified
+        if (isRefresh && !append && firstPageEtag) {
+            headers['If-None-Match'] = firstPageEtag;
+        }
+        const response = await fetch(codesUrl(append ? nextCursor : null), { headers });
 
+        if (response.status === 304) {
+            console.log('Codes unchanged');
+            return;
+        }
         if (!response.ok) {
             throw new Error('Failed to load invitation codes');
         }
 
-        codes = await response.json();
+        const page = await response.json();
+        if (!append) {
+            firstPageEtag = response.headers.get('ETag');
+            syncVersion = page.version;
+        }
+        codes = append ? codes.concat(page.codes) : page.codes;
+        nextCursor = page.next_cursor;
+        loadMoreButton.style.display = nextCursor ? 'block' : 'none';
         filterAndDisplayCodes();
     } catch (error) {
         console.error('Error loading codes:', error);
     } finally {
+        loadMoreButton.disabled = false;
         if (isRefresh) {
             refreshButton.disabled = false;
             refreshButton.classList.remove('refreshing');
@@ -113,6 +194,181 @@ async function loadCodes(isRefresh = false) {
     }
 }
 
+// Refresh: without filters, fetch only the codes changed since the last
+// load; with filters, re-request the first page conditionally
+async function refreshCodes() {
+    const filtered = statusFilter.value || codePrefix.value.trim() || namePrefix.value.trim();
+    if (filtered || syncVersion === null) {
+        return loadCodes(true);
+    }
+
+    refreshButton.disabled = true;
+    refreshButton.classList.add('refreshing');
+    try {
+        let hasMore = true;
+        while (hasMore) {
+            const response = await fetch(`/api/codes/changes?since=${encodeURIComponent(syncVersion)}`, {
+                headers: {
+                    'Authorization': `Bearer ${accessToken}`
+                }
+            });
+
+            if (response.status === 501 || response.status === 410) {
+                // Change tracking is not installed, or this version is too
+                // old for the kept history; fall back to a full reload
+                syncVersion = null;
+                return loadCodes(true);
+            }
+            if (!response.ok) {
+                throw new Error('Failed to load code changes');
+            }
+
+            const delta = await response.json();
+            const deleted = new Set(delta.deleted);
+            codes = codes.filter(code => !deleted.has(code.code));
+            delta.changes.forEach(mergeChangedCode);
+            syncVersion = delta.cursor;
+            hasMore = delta.has_more;
+        }
+        filterAndDisplayCodes();
+    } catch (error) {
+        console.error('Error syncing codes:', error);
+    } finally {
+        refreshButton.disabled = false;
+        refreshButton.classList.remove('refreshing');
+    }
+}
+
+// Live updates: read the /api/events Server-Sent Events stream with fetch,
+// so the token travels in the Authorization header rather than the URL
+const RECONNECT_MIN_DELAY = 5000;
+const RECONNECT_MAX_DELAY = 120000;
+
+async function subscribeToChanges() {
+    let delay = RECONNECT_MIN_DELAY;
+    while (accessToken) {
+        try {
+            const response = await fetch('/api/events', {
+                headers: {
+                    'Authorization': `Bearer ${accessToken}`
+                }
+            });
+            if (response.status === 401) {
+                console.error('Live updates stopped: session expired');
+                return;
+            }
+            if (response.status === 429) {
+                // Rate limited: wait at least as long as the server asks
+                const retryAfter = Number(response.headers.get('Retry-After')) * 1000;
+                delay = Math.min(Math.max(delay, retryAfter || 0), RECONNECT_MAX_DELAY);
+                throw new Error('Event stream rate limited');
+            }
+            if (!response.ok) {
+                throw new Error(`Event stream failed with ${response.status}`);
+            }
+
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value;
+                const messages = buffer.split('\n\n');
+                buffer = messages.pop();
+                for (const message of messages) {
+                    const event = handleEventMessage(message);
+                    if (event === 'ready') {
+                        // Connected again: back to the short delay
+                        delay = RECONNECT_MIN_DELAY;
+                    } else if (event === 'expired') {
+                        console.error('Live updates stopped: session expired');
+                        return;
+                    }
+                }
+            }
+        } catch (error) {
+            console.error('Live updates disconnected:', error);
+        }
+        // Reconnect after a growing pause, so repeated failures do not use up
+        // the request rate limit; anything missed meanwhile is reloaded
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 2, RECONNECT_MAX_DELAY);
+        await loadCodes();
+    }
+}
+
+function handleEventMessage(message) {
+    let event = 'message';
+    let data = '';
+    message.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        if (line.startsWith('data: ')) data += line.slice(6);
+    });
+
+    if (event === 'resync') {
+        loadCodes();
+    } else if (event === 'codes') {
+        applyCodeChanges(JSON.parse(data));
+    }
+    return event;
+}
+
+// Patch loaded codes in place
+function applyCodeChanges(changes) {
+    changes.forEach(({ op, code: changed }) => {
+        if (op === 'DELETE') {
+            codes = codes.filter(code => code.code !== changed.code);
+        } else {
+            mergeChangedCode(changed);
+        }
+    });
+    filterAndDisplayCodes();
+}
+
+// Merge a changed code into the loaded pages. Loaded rows are updated, or
+// dropped once they no longer match the filters. A code that is not loaded
+// is only added when it matches the filters and is newer than every loaded
+// row; anything else is left for Load More, so the list stays in step with
+// its cursor.
+function mergeChangedCode(changed) {
+    const index = codes.findIndex(code => code.code === changed.code);
+    if (index >= 0) {
+        if (matchesFilters(changed)) {
+            codes[index] = changed;
+        } else {
+            codes.splice(index, 1);
+        }
+    } else if (matchesFilters(changed) && isNewerThanLoaded(changed)) {
+        codes.unshift(changed);
+    }
+}
+
+// The status and prefix filters, as the server applies them
+function matchesFilters(code) {
+    if (statusFilter.value) {
+        const expired = new Date() >= new Date(code.expires_at);
+        const status = code.is_valid ? 'valid' : (expired ? 'expired' : 'exhausted');
+        if (status !== statusFilter.value) return false;
+    }
+    const codeFilter = codePrefix.value.trim();
+    if (codeFilter && !code.code.startsWith(codeFilter)) return false;
+    const nameFilter = namePrefix.value.trim().toLowerCase();
+    if (nameFilter && ![code.first_name, code.last_name].some(name => (name || '').toLowerCase().startsWith(nameFilter))) {
+        return false;
+    }
+    return true;
+}
+
+// Whether a code comes before every loaded code in the server's newest-first
+// (created_at, id) order
+function isNewerThanLoaded(code) {
+    const createdAt = new Date(code.created_at).getTime();
+    return codes.every(loaded => {
+        const loadedAt = new Date(loaded.created_at).getTime();
+        return createdAt > loadedAt || (createdAt === loadedAt && code.id > loaded.id);
+    });
+}
+
 // Sort Handler
 function handleSort(field) {
     if (currentSort.field === field) {
@@ -133,15 +389,10 @@ function handleSort(field) {
     filterAndDisplayCodes();
 }
 
-// Filter and Display Codes
+// Sort and Display Codes (filters are applied by the server)
 function filterAndDisplayCodes() {
     let filteredCodes = [...codes];
 
-    // Apply valid-only filter if checked
-    if (showValidOnly.checked) {
-        filteredCodes = filteredCodes.filter(code => code.is_valid);
-    }
-
     // Apply sorting
     filteredCodes.sort((a, b) => {
         let aVal = a[currentSort.field];
@@ -72,9 +72,10 @@ async function validateInvitationCode(code) {
     }
 }
 
-async function incrementCodeUsage(code) {
+// Uses one call of the code and gets a signed URL in a single request
+async function startSession(code) {
     try {
-        const response = await fetch('/api/increment-code', {
+        const response = await fetch('/api/start-session', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -84,12 +85,14 @@ async function incrementCodeUsage(code) {
 
         if (!response.ok) {
             const error = await response.json();
-            throw new Error(error.detail || 'Failed to increment code usage');
+            throw new Error(error.detail || 'Failed to start session');
         }
 
-        return true;
+        const data = await response.json();
+        currentInvitationData = data;
+        return data;
     } catch (error) {
-        console.error('Error incrementing code usage:', error);
+        console.error('Error starting session:', error);
         throw error;
     }
 }
@@ -148,31 +151,6 @@ async function requestMicrophonePermission() {
     }
 }
 
-async function getSignedUrl() {
-    try {
-        console.log('Fetching signed URL...');
-        const response = await fetch('/api/signed-url');
-        
-        console.log('Signed URL Response:', {
-            status: response.status,
-            statusText: response.statusText,
-            headers: Object.fromEntries(response.headers.entries())
-        });
-        
-        const data = await response.json();
-        console.log('Signed URL Data:', data);
-        
-        if (!response.ok) {
-            throw new Error(`Failed to get signed URL: ${response.status} ${response.statusText}`);
-        }
-        
-        return data.signedUrl;
-    } catch (error) {
-        console.error('Error getting signed URL:', error);
-        throw error;
-    }
-}
-
 async function getAgentId() {
     const response = await fetch('/api/getAgentId');
     const { agentId } = await response.json();
@@ -204,18 +182,17 @@ async function startConversation() {
     const endButton = document.getElementById('endButton');
     
     try {
-        // Validate code again and increment usage
-        await validateInvitationCode(currentInvitationCode);
-        await incrementCodeUsage(currentInvitationCode);
-
         const hasPermission = await requestMicrophonePermission();
         if (!hasPermission) {
             alert('Microphone permission is required for the conversation.');
             return;
         }
 
-        const signedUrl = await getSignedUrl();
-        const ConversationClass = await loadElevenLabsClient();
+        // Validate code again, use one call and get the signed URL
+        const [{ signedUrl }, ConversationClass] = await Promise.all([
+            startSession(currentInvitationCode),
+            loadElevenLabsClient()
+        ]);
         
         // Use first name from invitation code data, fallback to "Charlie"
         const customerName = (currentInvitationData?.first_name && currentInvitationData.first_name.trim()) 